@@ -0,0 +1,104 @@
+from math import pi
+
+import numpy as np
+
+import common
+import optimize
+
+# closed form expected cut of a single qaoa layer exp(-i beta B) exp(-i gamma C)
+# applied to |+>^n. the first mixer and the last cost layer of the circuits do
+# not change the result (see qaoa_gates in circuit.py), so rounds=1 always
+# gives half the total weight and rounds=2 is this single layer with gamma
+# from round 0 and beta from round 1.
+#
+# for an edge (u,v) of weight w, with w_uk the weight between u and k (0 when
+# there is no edge),
+#   <Z_u Z_v> = -sin(4 beta)/2 sin(gamma w) (P_u + P_v)
+#             - sin(2 beta)^2/2 (Q_plus - Q_minus)
+#   P_u = prod_{k != v} cos(gamma w_uk)
+#   Q_plus/minus = prod_{k != u,v} cos(gamma (w_uk +/- w_vk))
+# and the edge contributes w (1 - <Z_u Z_v>)/2. for unit weights the products
+# only depend on the degrees of u and v and the number of triangles on the edge.
+
+
+# the factors of a product as a sorted tuple of (coefficient, multiplicity),
+# cos(gamma*0) = 1 factors are dropped
+def _factors(coeffs):
+    multiplicity = {}
+    for c in coeffs:
+        c = abs(c)
+        if c != 0.0:
+            multiplicity[c] = multiplicity.get(c, 0) + 1
+    return tuple(sorted(multiplicity.items()))
+
+
+def _product(factors, gamma):
+    result = np.ones_like(gamma)
+    for coeff, power in factors:
+        result = result*np.cos(gamma*coeff)**power
+    return result
+
+
+class SingleLayerLandscape(object):
+    def __init__(self, graph):
+        weights = common.merged_edges(graph)
+
+        neighbors = {}
+        for (fr, to), w in weights.items():
+            neighbors.setdefault(fr, {})[to] = w
+            neighbors.setdefault(to, {})[fr] = w
+
+        self.total_weight = sum(weights.values())
+
+        # edges with the same statistics are evaluated once
+        groups = {}
+        for (u, v), w in weights.items():
+            nu = neighbors[u]
+            nv = neighbors[v]
+            others = (set(nu) | set(nv)) - set([u, v])
+            p_u = _factors([nu[k] for k in nu if k != v])
+            p_v = _factors([nv[k] for k in nv if k != u])
+            q_plus = _factors([nu.get(k, 0.0) + nv.get(k, 0.0) for k in others])
+            q_minus = _factors([nu.get(k, 0.0) - nv.get(k, 0.0) for k in others])
+            key = (w, tuple(sorted([p_u, p_v])), q_plus, q_minus)
+            groups[key] = groups.get(key, 0) + 1
+        self.groups = [(count, key) for key, count in groups.items()]
+
+    # beta and gamma may be arrays of any (broadcastable) shape
+    def expected_cut(self, beta, gamma):
+        beta = np.asarray(beta, dtype=np.float64)
+        gamma = np.asarray(gamma, dtype=np.float64)
+        shape = np.broadcast(beta, gamma).shape
+        beta = np.broadcast_to(beta, shape)
+        gamma = np.broadcast_to(gamma, shape)
+
+        s4 = -np.sin(4.0*beta)/2.0
+        s2 = np.sin(2.0*beta)**2/2.0
+        total = np.zeros(shape, dtype=np.float64)
+        for count, (w, (p_u, p_v), q_plus, q_minus) in self.groups:
+            zz = s4*np.sin(gamma*w)*(_product(p_u, gamma) + _product(p_v, gamma))
+            zz -= s2*(_product(q_plus, gamma) - _product(q_minus, gamma))
+            total += count*w*(1.0 - zz)/2.0
+        return total
+
+    # expected cut of a config rounds list with at most two rounds
+    def rounds_expected_cut(self, rounds):
+        assert(len(rounds) <= 2)
+        if len(rounds) < 2:
+            return self.total_weight/2.0
+        return float(self.expected_cut(rounds[1]['beta'], rounds[0]['gamma']))
+
+    # the best (beta, gamma, expected cut) on a grid of the given values
+    def grid_best(self, beta_vals, gamma_vals):
+        beta, gamma = np.meshgrid(beta_vals, gamma_vals, indexing='ij')
+        values = self.expected_cut(beta, gamma)
+        i, j = np.unravel_index(np.argmax(values), values.shape)
+        return float(beta[i, j]), float(gamma[i, j]), float(values[i, j])
+
+    # grid search over one period of the unweighted landscape refined by
+    # nelder-mead, returns (beta, gamma, expected cut)
+    def maximize(self, steps=64, iterations=200):
+        beta, gamma, value = self.grid_best(np.arange(steps)*pi/steps, np.arange(steps)*2.0*pi/steps)
+        f = lambda x: float(self.expected_cut(x[0], x[1]))
+        x, value = optimize.nelder_mead(f, np.array([beta, gamma]), iterations, step=pi/steps)
+        return float(x[0]), float(x[1]), value
@@ -0,0 +1,135 @@
+import os, json, hashlib, tempfile
+
+import common
+
+# an on-disk cache of evaluated angle configurations, each entry is a small
+# json file named by the hash of (graph, rounds, evaluator settings), this
+# keeps writes from concurrent workers atomic without any locking
+
+entry_suffix = '.json'
+
+
+def entry_key(graph_digest, rounds, settings):
+    key = {
+        'graph': graph_digest,
+        'rounds': [[repr(float(r['beta'])), repr(float(r['gamma']))] for r in rounds],
+        'settings': settings
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class EvaluationCache(object):
+    def __init__(self, directory, max_bytes=None, read_only=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self._size = None
+        if not read_only and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + entry_suffix)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as file:
+                entry = json.load(file)
+        except (IOError, OSError, ValueError):
+            return None
+        if not self.read_only:
+            # mark the entry as recently used for eviction
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        return entry
+
+    def put(self, key, entry):
+        if self.read_only:
+            return
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(entry, file)
+        os.rename(tmp_path, path)
+
+        if self.max_bytes is not None:
+            if self._size is None:
+                self._size = sum(size for (_, size, _) in self._entries())
+            self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _entries(self):
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(entry_suffix):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    # removes least recently used entries until the cache is below 90% of
+    # its size bound, other processes may evict concurrently so missing
+    # files are ignored
+    def evict(self):
+        entries = sorted(self._entries(), key=lambda x: x[2])
+        size = sum(e[1] for e in entries)
+        target = 0.9*self.max_bytes
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+        self._size = size
+
+
+# wraps an evaluator so that only configurations missing from the cache are
+# evaluated, the wrapped evaluator must provide settings() describing
+# everything besides the angles that determines its result
+class CachedEvaluator(object):
+    def __init__(self, evaluator, cache):
+        self.evaluator = evaluator
+        self.cache = cache
+        self.graph = evaluator.graph
+        self.graph_digest = common.graph_hash(evaluator.graph)
+
+    def settings(self):
+        return self.evaluator.settings()
+
+    def __call__(self, rounds):
+        return self.batch([rounds])[0]
+
+    # only the missing configurations are passed on, as one batch
+    def batch(self, rounds_list):
+        settings = self.settings()
+        keys = [entry_key(self.graph_digest, rounds, settings) for rounds in rounds_list]
+        results = [None]*len(rounds_list)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = self.cache.get(key)
+            if entry is not None:
+                results[i] = (entry['expected_cut'], entry['counts'])
+            else:
+                missing.append(i)
+
+        if len(missing) > 0:
+            values = self.evaluator.batch([rounds_list[i] for i in missing])
+            for i, (ec, counts) in zip(missing, values):
+                self.cache.put(keys[i], {'expected_cut':ec, 'counts':counts})
+                results[i] = (ec, counts)
+
+        return results
@@ -0,0 +1,216 @@
+from collections import namedtuple
+
+from common import Edge, merged_edges
+import profiling
+
+# the maxcut qaoa circuit as a list of gates whose angles are either constants
+# or multiples of a round parameter (b00, g00, b01, ...), this is built once
+# per (graph, rounds) and bound to concrete angles for each evaluation
+
+Gate = namedtuple('Gate', ['name', 'angles', 'qubits'])
+Angle = namedtuple('Angle', ['param', 'coeff'])
+
+beta_template = 'b{:02d}'
+gamma_template = 'g{:02d}'
+
+
+def round_params(rounds):
+    params = {}
+    for r, values in enumerate(rounds):
+        params[beta_template.format(r)] = values['beta']
+        params[gamma_template.format(r)] = values['gamma']
+    return params
+
+
+# merges parallel edges and orders the edges into layers that do not share
+# nodes (a greedy edge coloring), the edge terms commute so the layers can be
+# emitted in any order and each layer runs in parallel
+def edge_layers(graph):
+    weights = merged_edges(graph)
+
+    degree = {}
+    for fr, to in weights.keys():
+        degree[fr] = degree.get(fr, 0) + 1
+        degree[to] = degree.get(to, 0) + 1
+
+    layers = []
+    layer_nodes = []
+    for fr, to in sorted(weights.keys(), key=lambda x: (-(degree[x[0]] + degree[x[1]]), x)):
+        for layer, nodes in zip(layers, layer_nodes):
+            if not fr in nodes and not to in nodes:
+                break
+        else:
+            layer = []
+            nodes = set()
+            layers.append(layer)
+            layer_nodes.append(nodes)
+        layer.append(Edge(fr, to, weights[(fr, to)]))
+        nodes.add(fr)
+        nodes.add(to)
+
+    return layers
+
+
+# the edge term as emitted by the original scripts, 10 gates per edge
+def _legacy_edge_gates(e, gamma):
+    half = e.weight/2.0
+    return [
+        Gate('x', (), (e.fr,)),
+        Gate('u1', (Angle(gamma, -half),), (e.fr,)),
+        Gate('x', (), (e.fr,)),
+        Gate('u1', (Angle(gamma, -half),), (e.fr,)),
+        Gate('cx', (), (e.fr, e.to)),
+        Gate('x', (), (e.to,)),
+        Gate('u1', (Angle(gamma, half),), (e.to,)),
+        Gate('x', (), (e.to,)),
+        Gate('u1', (Angle(gamma, -half),), (e.to,)),
+        Gate('cx', (), (e.fr, e.to))
+    ]
+
+
+# the same edge term up to a global phase, exp(-i gamma w) on cut states
+def _edge_gates(e, gamma):
+    return [
+        Gate('cx', (), (e.fr, e.to)),
+        Gate('u1', (Angle(gamma, -e.weight),), (e.to,)),
+        Gate('cx', (), (e.fr, e.to))
+    ]
+
+
+# each round applies the mixer and then the cost layer. the first mixer acts
+# on |+>^n where it is only a global phase, and the last cost layer is
+# diagonal, so it commutes with the measurement and with the edge observables.
+# neither changes the measured distribution: one round always gives half the
+# total weight, and an edge term after p rounds only depends on the nodes
+# within distance p-1 of the edge (lightcone.py, analytic.py)
+def qaoa_gates(graph, num_rounds, legacy=False):
+    num_bits = graph.max_node
+    gates = []
+
+    for i in range(num_bits):
+        gates.append(Gate('h', (), (i,)))
+
+    if legacy:
+        layers = [graph.edges]
+    else:
+        layers = edge_layers(graph)
+
+    for r in range(num_rounds):
+        beta = beta_template.format(r)
+        gamma = gamma_template.format(r)
+
+        if legacy or r > 0:
+            for i in range(num_bits):
+                gates.append(Gate('u3', (Angle(beta, 2.0), '-pi/2', 'pi/2'), (i,)))
+
+        if legacy or r < num_rounds-1:
+            # weighted edges scale the angle of their cost term
+            for layer in layers:
+                for e in layer:
+                    if legacy:
+                        gates.extend(_legacy_edge_gates(e, gamma))
+                    else:
+                        gates.extend(_edge_gates(e, gamma))
+
+    if not legacy:
+        gates = merge_gates(gates)
+
+    profiling.count('gates emitted', len(gates))
+    return gates
+
+
+def _is_param_u1(gate):
+    return gate.name == 'u1' and isinstance(gate.angles[0], Angle)
+
+
+# peephole pass: adjacent u1 rotations of the same parameter on a qubit are
+# merged, zero rotations are dropped and adjacent identical cx gates cancel
+def merge_gates(gates):
+    merged = []
+    last = {}
+    for gate in gates:
+        if _is_param_u1(gate):
+            q = gate.qubits[0]
+            prev = last.get(q, [])
+            if gate.angles[0].coeff == 0.0:
+                continue
+            if len(prev) > 0 and _is_param_u1(merged[prev[-1]]) and merged[prev[-1]].angles[0].param == gate.angles[0].param:
+                coeff = merged[prev[-1]].angles[0].coeff + gate.angles[0].coeff
+                if coeff == 0.0:
+                    merged[prev.pop()] = None
+                else:
+                    merged[prev[-1]] = Gate('u1', (Angle(gate.angles[0].param, coeff),), (q,))
+                continue
+        if gate.name == 'cx':
+            prev_a = last.get(gate.qubits[0], [])
+            prev_b = last.get(gate.qubits[1], [])
+            if len(prev_a) > 0 and len(prev_b) > 0 and prev_a[-1] == prev_b[-1] and merged[prev_a[-1]] == gate:
+                merged[prev_a.pop()] = None
+                prev_b.pop()
+                continue
+        merged.append(gate)
+        for q in gate.qubits:
+            last.setdefault(q, []).append(len(merged)-1)
+
+    return [g for g in merged if g is not None]
+
+
+def depth(gates):
+    level = {}
+    for gate in gates:
+        l = 1 + max(level.get(q, 0) for q in gate.qubits)
+        for q in gate.qubits:
+            level[q] = l
+    return max(level.values()) if len(level) > 0 else 0
+
+
+# the circuit as qasm text with a format field for every distinct
+# (parameter, coefficient) pair, binding is a single str.format call
+class QAOATemplate(object):
+    def __init__(self, graph, num_rounds, legacy=False):
+        self.num_bits = graph.max_node
+        self.num_rounds = num_rounds
+        self.gates = qaoa_gates(graph, num_rounds, legacy)
+
+        field_names = {}
+        self.fields = []
+
+        def render(angle):
+            if not isinstance(angle, Angle):
+                return angle
+            if not angle in field_names:
+                name = 'f{}'.format(len(self.fields))
+                field_names[angle] = name
+                self.fields.append((name, angle.param, angle.coeff))
+            return '{' + field_names[angle] + '}'
+
+        lines = [
+            'OPENQASM 2.0;',
+            'include "qelib1.inc";',
+            'qreg qr[{}];'.format(self.num_bits),
+            'creg cr[{}];'.format(self.num_bits)
+        ]
+        for gate in self.gates:
+            qubits = ','.join('qr[{}]'.format(q) for q in gate.qubits)
+            if len(gate.angles) > 0:
+                angles = ','.join(render(a) for a in gate.angles)
+                lines.append('{}({}) {};'.format(gate.name, angles, qubits))
+            else:
+                lines.append('{} {};'.format(gate.name, qubits))
+        lines.append('measure qr -> cr;')
+        self.qasm = '\n'.join(lines) + '\n'
+
+    # returns qasm text for the given list of {'beta':..., 'gamma':...}
+    def bind(self, rounds):
+        assert(len(rounds) == self.num_rounds)
+        params = round_params(rounds)
+        values = {name:'{:.17f}'.format(coeff*params[param]) for name, param, coeff in self.fields}
+        return self.qasm.format(**values)
+
+
+# adds the maxcut qaoa circuit for the given rounds to a QuantumProgram,
+# rounds is a list of {'beta':..., 'gamma':...} as in the config files
+def build_qaoa(qp, graph, rounds, name='qaoa', template=None):
+    if template is None:
+        template = QAOATemplate(graph, len(rounds))
+    return qp.load_qasm_text(template.bind(rounds), name=name)
@@ -1,9 +1,19 @@
-import random
+import os, hashlib
 
 from collections import namedtuple
 
+import numpy as np
+
+import profiling
+
 Graph = namedtuple('Graph', ['nodes', 'edges', 'max_node'])
 Edge = namedtuple('Edge', ['fr', 'to', 'weight'])
+EdgeIndex = namedtuple('EdgeIndex', ['fr', 'to', 'weight', 'max_node'])
+# measurement counts as parallel arrays of packed states and their counts
+Counts = namedtuple('Counts', ['states', 'counts', 'num_bits'])
+
+# states are packed into uint64, bit i holds the assignment of node i
+max_packed_bits = 64
 
 json_dumps_kwargs = {
     'sort_keys':True,
@@ -11,32 +21,111 @@ json_dumps_kwargs = {
     'separators':(',', ': ')
 }
 
-def load_graph(file_name):
-    nodes = set()
-    edges = []
+# lines are parsed in blocks of this size, each block is converted with a
+# single numpy call
+load_block_lines = 2**16
+
+
+# lines without exactly 3 fields are reported and skipped, the remaining
+# lines are converted together
+def _parse_edge_block(lines):
+    tokens = []
+    num_rows = 0
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3:
+            tokens.extend(parts)
+            num_rows += 1
+        else:
+            print('the following line was scipped:\n{}'.format(line))
+    return np.array(tokens, dtype=np.float64).reshape(num_rows, 3)
+
+
+# streams a .qx file into edge arrays without holding its lines in memory,
+# with use_cache the arrays are also stored in a .npz file next to the source
+# and reused while the source is unchanged
+def load_edges(file_name, use_cache=False):
+    cache_file = file_name + '.npz'
+    stat = os.stat(file_name)
+    if use_cache and os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            if int(data['source_size']) == stat.st_size and int(data['source_mtime_ns']) == stat.st_mtime_ns:
+                return EdgeIndex(data['fr'], data['to'], data['weight'], int(data['max_node']))
+
     with open(file_name, 'r') as file:
-        lines = file.readlines()
-        lines = [line for line in lines if not line.strip().startswith('#')]
-
-        max_node, num_edges = [int(x) for x in lines[0].strip().split(' ')]
-        #print(max_node, ' ', num_edges)
-        for line in lines[1:]:
-            parts = line.strip().split(' ')
-            if len(parts) == 3:
-                fr, to, weight = parts
-                e = Edge(int(fr), int(to), float(weight))
-                edges.append(e)
-                nodes.add(e.fr)
-                nodes.add(e.to)
-                # this solver only works for max cut problems
-                assert(e.weight == 1.0)
-            else:
-                print('the following line was scipped:\n{}'.format(line))
-        assert(min(nodes) >= 0)
-        assert(max(nodes)+1 == max_node)
-        assert(len(edges) == num_edges)
-
-    return Graph(nodes, edges, max_node)
+        header = None
+        blocks = []
+        block = []
+        for line in file:
+            line = line.strip()
+            if len(line) == 0 or line.startswith('#'):
+                continue
+            if header is None:
+                header = [int(x) for x in line.split()]
+                continue
+            block.append(line)
+            if len(block) >= load_block_lines:
+                blocks.append(_parse_edge_block(block))
+                block = []
+        if len(block) > 0:
+            blocks.append(_parse_edge_block(block))
+
+    max_node, num_edges = header
+    if len(blocks) > 0:
+        data = np.concatenate(blocks)
+    else:
+        data = np.zeros((0, 3), dtype=np.float64)
+    assert(data[:,:2].min() >= 0)
+    # node ids must be integers, the cast below would truncate 1.7 to 1
+    assert(np.all(data[:,:2] == np.floor(data[:,:2])))
+    fr = data[:,0].astype(np.uint64)
+    to = data[:,1].astype(np.uint64)
+    weight = data[:,2].copy()
+
+    assert(len(fr) == num_edges)
+    assert(max(fr.max(), to.max())+1 == max_node)
+
+    if use_cache:
+        np.savez(cache_file, fr=fr, to=to, weight=weight, max_node=max_node,
+            source_size=stat.st_size, source_mtime_ns=stat.st_mtime_ns)
+
+    return EdgeIndex(fr, to, weight, max_node)
+
+
+def load_graph(file_name, use_cache=False):
+    index = load_edges(file_name, use_cache)
+
+    frs = index.fr.tolist()
+    tos = index.to.tolist()
+    weights = index.weight.tolist()
+
+    edges = [Edge(fr, to, weight) for fr, to, weight in zip(frs, tos, weights)]
+    nodes = set(frs)
+    nodes.update(tos)
+
+    return Graph(nodes, edges, index.max_node)
+
+
+# a digest of the graph content, comments and formatting of the .qx file do
+# not change it
+def graph_hash(graph):
+    h = hashlib.sha256()
+    h.update('{}\n'.format(graph.max_node).encode('utf-8'))
+    for e in sorted(graph.edges):
+        h.update('{} {} {!r}\n'.format(e.fr, e.to, float(e.weight)).encode('utf-8'))
+    return h.hexdigest()
+
+
+# {(fr, to): weight} with fr < to, parallel edges add their weights and self
+# loops are dropped since they are never cut
+def merged_edges(graph):
+    weights = {}
+    for e in graph.edges:
+        if e.fr == e.to:
+            continue
+        key = (min(e.fr, e.to), max(e.fr, e.to))
+        weights[key] = weights.get(key, 0.0) + e.weight
+    return weights
 
 
 def remap(graph):
@@ -56,7 +145,10 @@ def cut_value(graph, assignment):
     cut = 0
     for e in graph.edges:
         if assignment[e.fr] != assignment[e.to]:
-            cut += 1
+            cut += e.weight
+    # unit weights give the same int cut sizes as before
+    if float(cut).is_integer():
+        return int(cut)
     return cut
 
 
@@ -71,12 +163,14 @@ def frange(start, stop, steps, include_start=True):
 
 
 # Python 2 compatible version
+# indexes are visited in the given order, so the enumeration order is the
+# same in every process (checkpoints rely on this)
 def dfs(indexes, values, assignment):
     if len(indexes) == 0:
         yield assignment
     else:
-        indexes_next = set(indexes)
-        index = indexes_next.pop()
+        index = indexes[0]
+        indexes_next = indexes[1:]
         for value in values[index]:
             assignment[index] = value
             #yield from dfs(indexes_next, assignment) # python3 only
@@ -93,40 +187,166 @@ def str2vals(string):
     return [int(v) for v in vals]
 
 
-def cut_dist(graph, counts):
-    cut_counts = {}
-    for state, count in counts.items():
-        assignment = str2vals(state)
-        #print('{} => {}'.format(state, assignment))
-        cv = cut_value(graph, assignment)
-        #print('{}'.format(cv))
-        if not cv in cut_counts:
-            cut_counts[cv] = 0
-        cut_counts[cv] = cut_counts[cv] + count
+# converts the graph into edge endpoint arrays, so that cut values can be
+# evaluated for many states at once
+def edge_index(graph):
+    if isinstance(graph, EdgeIndex):
+        return graph
+    fr = np.array([e.fr for e in graph.edges], dtype=np.uint64)
+    to = np.array([e.to for e in graph.edges], dtype=np.uint64)
+    weight = np.array([e.weight for e in graph.edges], dtype=np.float64)
+    return EdgeIndex(fr, to, weight, graph.max_node)
+
+
+# packs bit strings into integers, the last character of the string is bit 0
+# (this is the same reversal that str2vals does)
+def pack_states(states):
+    states = list(states)
+    if len(states) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    num_bits = len(states[0])
+    if num_bits == 0 or any(len(s) != num_bits for s in states):
+        return np.fromiter((int(s, 2) for s in states), dtype=np.uint64, count=len(states))
+    # all strings as one (states, bits) array of characters, bits are or-ed in
+    # column by column
+    chars = np.frombuffer(''.join(states).encode('ascii'), dtype=np.uint8).reshape(len(states), num_bits)
+    assert np.all((chars == ord('0')) | (chars == ord('1'))), 'states must be bit strings'
+    packed = np.zeros(len(states), dtype=np.uint64)
+    for j in range(num_bits):
+        packed |= (chars[:,j] == ord('1')).astype(np.uint64) << np.uint64(num_bits-1-j)
+    return packed
+
+
+def unpack_states(states, num_bits):
+    template = '{0:0'+str(num_bits)+'b}'
+    return [template.format(s) for s in np.asarray(states, dtype=np.uint64).tolist()]
+
+
+# converts backend counts ({bit string: count}) into Counts once, Counts are
+# passed through unchanged
+def packed_counts(counts, num_bits=None):
+    if isinstance(counts, Counts):
+        return counts
+    states = list(counts.keys())
+    if num_bits is None:
+        num_bits = len(states[0]) if len(states) > 0 else 0
+    values = np.fromiter((counts[s] for s in states), dtype=np.int64, count=len(states))
+    return Counts(pack_states(states), values, num_bits)
+
+
+def counts_dict(counts):
+    return {s:int(c) for s, c in zip(unpack_states(counts.states, counts.num_bits), counts.counts.tolist())}
+
+
+# the counts ordered from the most to the least frequent state
+def sorted_counts(counts):
+    order = np.argsort(-counts.counts, kind='stable')
+    return Counts(counts.states[order], counts.counts[order], counts.num_bits)
+
+
+# true if all edge weights are whole numbers, cut values are then kept as ints
+def integral_weights(graph):
+    index = edge_index(graph)
+    return bool(np.all(index.weight == np.floor(index.weight)))
+
+
+# weighted cut values of an array of packed states, one vectorized xor pass
+# per edge
+def cut_values(graph, states):
+    index = edge_index(graph)
+    assert index.max_node <= max_packed_bits, 'packed states hold at most {} nodes'.format(max_packed_bits)
+    states = np.asarray(states, dtype=np.uint64)
+    profiling.count('cut states', states.size)
+    dtype = np.int64 if integral_weights(index) else np.float64
+    one = np.uint64(1)
+    cuts = np.zeros(states.shape, dtype=dtype)
+    for fr, to, weight in zip(index.fr, index.to, index.weight.astype(dtype)):
+        cuts += weight*(((states >> fr) ^ (states >> to)) & one).astype(dtype)
+    return cuts
+
+
+# a state and its complement have the same cut, this maps every state to the
+# one of the pair whose last bit is 0 and sums their weights
+def fold_states(states, weights, num_bits):
+    top = np.uint64(1) << np.uint64(num_bits-1)
+    mask = np.uint64(2**num_bits-1)
+    states = np.where(states & top, states ^ mask, states)
+    states, inverse = np.unique(states, return_inverse=True)
+    return states, np.bincount(inverse.ravel(), weights=weights, minlength=len(states))
+
+
+# cut values and weights of counts (a dict or Counts), with symmetric=True
+# complementary states are merged first so each cut is only evaluated once
+def counts_cut_values(graph, counts, symmetric=False):
+    counts = packed_counts(counts, graph.max_node)
+    states = counts.states
+    weights = counts.counts.astype(np.float64)
+    if symmetric and graph.max_node > 0:
+        states, weights = fold_states(states, weights, graph.max_node)
+    return cut_values(graph, states), weights
+
+
+# sums the weights of equal cut values into {cut value: weight}
+def _cut_totals(cvs, weights):
+    if cvs.dtype == np.float64:
+        # weighted cuts that only differ by summation order are merged
+        cvs = np.round(cvs, 9)
+    values, inverse = np.unique(cvs, return_inverse=True)
+    cut_counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(values))
+    return {cv.item():count for (cv,count) in zip(values, cut_counts)}
+
+
+# the cut distribution of cut values from counts_cut_values
+def values_cut_dist(cvs, weights):
+    cut_counts = _cut_totals(cvs, weights)
     total_counts = sum(cut_counts.values())
-    cut_dist = {cv:count/float(total_counts) for (cv,count) in cut_counts.items()}
+    cut_dist = {cv:float(count/total_counts) for (cv,count) in cut_counts.items()}
     return cut_dist
 
 
-def expected_cut(graph, counts):
-    cd = cut_dist(graph, counts)
-    return sum([cv*prob for (cv,prob) in cd.items()])
+def cut_dist(graph, counts, symmetric=False):
+    return values_cut_dist(*counts_cut_values(graph, counts, symmetric))
+
+
+def expected_cut(graph, counts, symmetric=False):
+    cvs, weights = counts_cut_values(graph, counts, symmetric)
+    assert weights.sum() > 0, 'the counts are empty'
+    return float(np.dot(cvs, weights)/weights.sum())
+
+
+# random states are drawn as packed integers in blocks of this size
+rand_block_samples = 2**20
+
+
+# cut values of a (states, nodes) array of bits, for graphs too large to pack
+def bit_cut_values(index, bits):
+    dtype = np.int64 if integral_weights(index) else np.float64
+    cuts = np.zeros(len(bits), dtype=dtype)
+    for fr, to, weight in zip(index.fr.tolist(), index.to.tolist(), index.weight.astype(dtype)):
+        cuts += weight*(bits[:,fr] ^ bits[:,to]).astype(dtype)
+    return cuts
+
 
+def rand_cut_dist(graph, samples, seed=None):
+    index = edge_index(graph)
+    rng = np.random.default_rng(seed)
 
-def rand_cut_dist(graph, samples):
-    num_bits = graph.max_node
-    num_states = 2**num_bits
-    bit_string_template = '{0:0'+str(num_bits)+'b}'
+    # graphs with more nodes than a packed state holds draw one byte per node,
+    # with blocks of the same memory as the packed ones
+    packed = index.max_node <= max_packed_bits
+    block_samples = rand_block_samples if packed else max(1, rand_block_samples*8//index.max_node)
 
     cut_counts = {}
-    states = [random.randint(0, num_states-1) for i in range(samples)]
-    for state in states:
-        bit_string = bit_string_template.format(state)
-        assignment = str2vals(bit_string)
-        cv = cut_value(graph, assignment)
-        if not cv in cut_counts:
-            cut_counts[cv] = 0
-        cut_counts[cv] = cut_counts[cv] + 1
+    for start in range(0, samples, block_samples):
+        size = min(block_samples, samples-start)
+        if packed:
+            states = rng.integers(0, 2**index.max_node, size=size, dtype=np.uint64)
+            cvs = cut_values(index, states)
+        else:
+            bits = rng.integers(0, 2, size=(size, index.max_node), dtype=np.uint8)
+            cvs = bit_cut_values(index, bits)
+        for cv, count in _cut_totals(cvs, None).items():
+            cut_counts[cv] = cut_counts.get(cv, 0) + int(count)
 
     cut_dist = {cv:count/float(samples) for (cv,count) in cut_counts.items()}
     return cut_dist
@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import common
+
+# exact maxcut by enumeration, the last node is fixed to 0 (a cut and its
+# complement have the same value), the lowest block_bits nodes are evaluated
+# together as a numpy vector and the remaining nodes are walked in gray code
+# order, so each step only applies the change of the one flipped node
+
+
+def _neighbors(index):
+    neighbors = [[] for i in range(index.max_node)]
+    for fr, to, weight in zip(index.fr.tolist(), index.to.tolist(), index.weight.tolist()):
+        if fr == to:
+            continue
+        neighbors[fr].append((to, weight))
+        neighbors[to].append((fr, weight))
+    return neighbors
+
+
+class _Task(object):
+    def __init__(self, index, block_bits, walk_bits):
+        self.index = index
+        self.block_bits = block_bits
+        self.walk_bits = walk_bits
+        self.neighbors = _neighbors(index)
+
+    # enumerates all states whose bits above the walked ones equal prefix
+    def __call__(self, prefix):
+        L = self.block_bits
+        low = np.arange(2**L, dtype=np.uint64)
+        base = prefix << (L + self.walk_bits)
+
+        cuts = common.cut_values(self.index, low | np.uint64(base)).astype(np.float64)
+
+        # change of the cut when flipping a walked node that is currently 0,
+        # split into the part from block neighbors (a vector) and from the
+        # other nodes (updated as the walk goes)
+        signs = [1.0 - 2.0*((low >> np.uint64(u)) & np.uint64(1)).astype(np.float64) for u in range(L)]
+        block_delta = []
+        for k in range(self.walk_bits):
+            delta = np.zeros(2**L, dtype=np.float64)
+            for u, w in self.neighbors[L+k]:
+                if u < L:
+                    delta += w*signs[u]
+            block_delta.append(delta)
+        del signs
+
+        state = base
+        best_value = cuts.max()
+        best_state = state | int(cuts.argmax())
+
+        for i in range(1, 2**self.walk_bits):
+            k = (i & -i).bit_length() - 1
+            j = L + k
+            bit = (state >> j) & 1
+            rest = 0.0
+            for u, w in self.neighbors[j]:
+                if u >= L:
+                    rest += w*(1 - 2*(bit ^ ((state >> u) & 1)))
+            if bit == 0:
+                cuts += block_delta[k]
+            else:
+                cuts -= block_delta[k]
+            cuts += rest
+            state ^= 1 << j
+
+            value = cuts.max()
+            if value > best_value:
+                best_value = value
+                best_state = state | int(cuts.argmax())
+
+        return best_value, best_state
+
+
+_task = None
+
+def _init_worker(task):
+    global _task
+    _task = task
+
+
+def _run_task(prefix):
+    return _task(prefix)
+
+
+# returns the maximum cut value and an assignment (list of 0/1 per node)
+# achieving it, practical up to about 34 nodes
+def max_cut(graph, workers=1, block_bits=18):
+    index = common.edge_index(graph)
+    num_bits = index.max_node
+    free_bits = max(0, num_bits-1)
+
+    L = min(block_bits, free_bits)
+    high_bits = free_bits - L
+    prefix_bits = 0
+    if workers > 1:
+        while prefix_bits < high_bits and 2**prefix_bits < 4*workers:
+            prefix_bits += 1
+
+    task = _Task(index, L, high_bits - prefix_bits)
+    prefixes = range(2**prefix_bits)
+    if workers <= 1:
+        results = [task(prefix) for prefix in prefixes]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(task,)) as executor:
+            results = list(executor.map(_run_task, prefixes))
+
+    best_value, best_state = max(results, key=lambda x: x[0])
+    if common.integral_weights(index):
+        best_value = int(round(best_value))
+    else:
+        best_value = float(best_value)
+    assignment = [(best_state >> i) & 1 for i in range(num_bits)]
+    return best_value, assignment
@@ -0,0 +1,167 @@
+import os, re, time, json, random, asyncio, hashlib, tempfile
+
+# remote execution of many circuits at once. circuits are submitted
+# concurrently, their status is polled with exponential backoff and job ids
+# are kept in a json file, so a restarted script picks up its running jobs
+# instead of submitting (and queueing) them again. clients wrap the blocking
+# backend api, the manager calls them from worker threads
+
+
+# identifies a circuit run, the same named qasm on the same backend and shots
+# is the same job
+def job_key(name, qasm, backend, shots):
+    return hashlib.sha256('{}\n{}\n{}\n{}'.format(name, backend, shots, qasm).encode('utf-8')).hexdigest()
+
+
+# the ibm quantum experience api of QuantumProgram.get_api() after set_api
+class QXClient(object):
+    def __init__(self, api, max_credits=3):
+        self.api = api
+        self.max_credits = max_credits
+
+    def submit(self, qasm, backend, shots):
+        output = self.api.run_job([{'qasm':qasm}], backend, shots=shots, max_credits=self.max_credits)
+        if 'error' in output:
+            raise RuntimeError('submitting to {} failed: {}'.format(backend, output['error']))
+        return output['id']
+
+    # returns (status, data), data is the result data of the circuit once the
+    # status is COMPLETED
+    def poll(self, job_id):
+        job = self.api.get_job(job_id)
+        assert 'status' in job, 'get_job did not return a status: {}'.format(job)
+        if job['status'] == 'COMPLETED':
+            return job['status'], job['qasms'][0]['data']
+        return job['status'], None
+
+
+# a stand in for a remote backend, jobs complete after a random latency and
+# are sampled by sampler(qasm, shots) or uniformly over the qasm's register
+class MockClient(object):
+    def __init__(self, latency=(0.5, 2.0), sampler=None, seed=None):
+        self.latency = latency
+        self.sampler = sampler
+        self.random = random.Random(seed)
+        self.jobs = {}
+        self.submitted = 0
+        self.polls = 0
+
+    def _uniform(self, qasm, shots):
+        num_bits = int(re.search(r'creg \w+\[(\d+)\]', qasm).group(1))
+        counts = {}
+        for i in range(shots):
+            state = '{0:0{1}b}'.format(self.random.getrandbits(num_bits), num_bits)
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def submit(self, qasm, backend, shots):
+        self.submitted += 1
+        job_id = 'mock-{:06d}'.format(self.submitted)
+        self.jobs[job_id] = (time.monotonic() + self.random.uniform(*self.latency), qasm, shots)
+        return job_id
+
+    def poll(self, job_id):
+        self.polls += 1
+        assert job_id in self.jobs, 'unknown job {}'.format(job_id)
+        ready, qasm, shots = self.jobs[job_id]
+        if time.monotonic() < ready:
+            return 'RUNNING', None
+        sampler = self.sampler if self.sampler is not None else self._uniform
+        return 'COMPLETED', {'counts':sampler(qasm, shots)}
+
+
+# job ids and finished results by job key, written atomically on every change
+class JobStore(object):
+    def __init__(self, file_name=None):
+        self.file_name = file_name
+        self.jobs = {}
+        if file_name is not None and os.path.exists(file_name):
+            with open(file_name, 'r') as file:
+                self.jobs = json.load(file)
+
+    def get(self, key):
+        return self.jobs.get(key)
+
+    def put(self, key, entry):
+        self.jobs[key] = entry
+        if self.file_name is None:
+            return
+        directory = os.path.dirname(os.path.abspath(self.file_name))
+        fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(self.jobs, file, sort_keys=True)
+        os.replace(tmp_name, self.file_name)
+
+
+# jobs in these states will not complete, their circuits are submitted again
+def failed(status):
+    return status.startswith('ERROR') or status == 'CANCELLED'
+
+
+class JobManager(object):
+    def __init__(self, client, store=None, poll_interval=1.0, max_poll_interval=30.0, backoff=2.0, timeout=None, max_submits=5):
+        self.client = client
+        self.store = store if store is not None else JobStore()
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_submits = max_submits
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _submit(self, key, name, qasm, backend, shots, semaphore):
+        async with semaphore:
+            job_id = await self._call(self.client.submit, qasm, backend, shots)
+        print('  submitted {}: {}'.format(name, job_id))
+        self.store.put(key, {'name':name, 'id':job_id, 'backend':backend, 'shots':shots, 'status':'RUNNING'})
+        return job_id
+
+    async def _wait(self, key, name, job_id):
+        interval = self.poll_interval
+        waited = 0.0
+        while True:
+            status, data = await self._call(self.client.poll, job_id)
+            if status == 'COMPLETED':
+                entry = dict(self.store.get(key))
+                entry['status'] = status
+                entry['data'] = data
+                self.store.put(key, entry)
+                print('  completed {}: {}'.format(name, job_id))
+                return data
+            if failed(status):
+                entry = dict(self.store.get(key))
+                entry['status'] = status
+                self.store.put(key, entry)
+                raise RuntimeError('job {} of {} ended with {}'.format(job_id, name, status))
+            if self.timeout is not None and waited >= self.timeout:
+                raise TimeoutError('job {} of {} still {} after {} seconds, rerun to keep waiting'.format(job_id, name, status, waited))
+
+            await asyncio.sleep(interval)
+            waited += interval
+            interval = min(interval*self.backoff, self.max_poll_interval)
+
+    async def run_one(self, name, qasm, backend, shots, semaphore):
+        key = job_key(name, qasm, backend, shots)
+        entry = self.store.get(key)
+        if entry is not None and entry['status'] == 'COMPLETED':
+            print('  stored {}: {}'.format(name, entry['id']))
+            return entry['data']
+        if entry is not None and not failed(entry['status']):
+            print('  resuming {}: {}'.format(name, entry['id']))
+            job_id = entry['id']
+        else:
+            if entry is not None:
+                print('  resubmitting {}: {} ended with {}'.format(name, entry['id'], entry['status']))
+            job_id = await self._submit(key, name, qasm, backend, shots, semaphore)
+        return await self._wait(key, name, job_id)
+
+    async def run_all(self, circuits, backend, shots):
+        semaphore = asyncio.Semaphore(self.max_submits)
+        results = await asyncio.gather(*[self.run_one(name, qasm, backend, shots, semaphore) for name, qasm in circuits])
+        return {name:data for (name, qasm), data in zip(circuits, results)}
+
+    # circuits is a list of (name, qasm), returns {name: result data}
+    def run(self, circuits, backend, shots):
+        return asyncio.run(self.run_all(circuits, backend, shots))
@@ -0,0 +1,182 @@
+import common
+from simulator import StatevectorSimulator, cut_diagonal
+
+# the expected cut is a sum of per edge terms and after p rounds each term
+# only depends on the nodes within distance p-1 of its edge (see qaoa_gates
+# in circuit.py). each edge is simulated on that neighborhood alone, and
+# neighborhoods that are isomorphic (as weighted graphs rooted at the edge)
+# are simulated once
+
+max_light_cone_bits = 24
+
+
+def _adjacency(weights):
+    adjacency = {}
+    for (fr, to), weight in weights.items():
+        adjacency.setdefault(fr, []).append((to, weight))
+        adjacency.setdefault(to, []).append((fr, weight))
+    return adjacency
+
+
+# nodes within radius of the edge, as {node: distance}
+def light_cone(adjacency, fr, to, radius):
+    distance = {fr:0, to:0}
+    frontier = [fr, to]
+    for d in range(1, radius+1):
+        next_frontier = []
+        for n in frontier:
+            for m, _ in adjacency[n]:
+                if not m in distance:
+                    distance[m] = d
+                    next_frontier.append(m)
+        frontier = next_frontier
+    return distance
+
+
+def _refine(colors, adjacency):
+    num_colors = len(set(colors.values()))
+    while True:
+        signatures = {}
+        for n, c in colors.items():
+            signatures[n] = (c, tuple(sorted((colors[m], w) for m, w in adjacency[n])))
+        ordered = {sig:i for i, sig in enumerate(sorted(set(signatures.values())))}
+        colors = {n:ordered[sig] for n, sig in signatures.items()}
+        if len(ordered) == num_colors:
+            return colors
+        num_colors = len(ordered)
+
+
+def _cells(colors):
+    cells = {}
+    for n, c in colors.items():
+        cells.setdefault(c, []).append(n)
+    return cells
+
+
+# refinement colors only depend on the structure of the cone, so the color
+# counts and the edges between colors are the same for isomorphic cones
+def _invariant(colors, edges):
+    counts = tuple(sorted((c, len(cell)) for c, cell in _cells(colors).items()))
+    return counts, tuple(sorted((min(colors[a], colors[b]), max(colors[a], colors[b]), w) for (a, b), w in edges.items()))
+
+
+# searches for a color preserving isomorphism between two refined cones of
+# equal invariants by individualization. a single one is needed, so for
+# symmetric cones the first branch usually succeeds instead of enumerating
+# all their labelings
+def isomorphic(cone_a, cone_b):
+    adjacency_a, edges_a, colors_a = cone_a
+    adjacency_b, edges_b, colors_b = cone_b
+    if _invariant(colors_a, edges_a) != _invariant(colors_b, edges_b):
+        return False
+
+    cells_a = _cells(colors_a)
+    cells_b = _cells(colors_b)
+    split = [c for c, cell in cells_a.items() if len(cell) > 1]
+
+    if len(split) == 0:
+        mapping = {cell[0]:cells_b[c][0] for c, cell in cells_a.items()}
+        for (a, b), w in edges_a.items():
+            if edges_b.get((min(mapping[a], mapping[b]), max(mapping[a], mapping[b]))) != w:
+                return False
+        return True
+
+    target = min(split)
+    individualized = {m:2*c for m, c in colors_a.items()}
+    individualized[cells_a[target][0]] = 2*target - 1
+    cone_a = (adjacency_a, edges_a, _refine(individualized, adjacency_a))
+    for n in cells_b[target]:
+        individualized = {m:2*c for m, c in colors_b.items()}
+        individualized[n] = 2*target - 1
+        if isomorphic(cone_a, (adjacency_b, edges_b, _refine(individualized, adjacency_b))):
+            return True
+    return False
+
+
+class LightConeSimulator(object):
+    def __init__(self, graph, num_rounds):
+        self.graph = graph
+        self.num_rounds = num_rounds
+        self.radius = max(0, num_rounds-1)
+
+        weights = common.merged_edges(graph)
+        adjacency = _adjacency(weights)
+
+        classes = {}
+        for (fr, to), weight in weights.items():
+            distance = light_cone(adjacency, fr, to, self.radius)
+            assert len(distance) <= max_light_cone_bits, 'light cone of edge ({},{}) has {} nodes'.format(fr, to, len(distance))
+
+            local_edges = {key:w for key, w in weights.items() if key[0] in distance and key[1] in distance}
+            local_adjacency = {n:[(m, w) for m, w in adjacency[n] if m in distance] for n in distance}
+            # the root edge is distinguished by its weight in the signature
+            colors = {n:d+1 for n, d in distance.items()}
+            colors[fr] = colors[to] = 0
+            local_adjacency[fr] = [(m, (w, m == to)) for m, w in local_adjacency[fr]]
+            local_adjacency[to] = [(m, (w, m == fr)) for m, w in local_adjacency[to]]
+            for n in distance:
+                if n != fr and n != to:
+                    local_adjacency[n] = [(m, (w, False)) for m, w in local_adjacency[n]]
+
+            cone = (local_adjacency, local_edges, _refine(colors, local_adjacency))
+            # cones of equal invariants are compared to the ones simulated
+            key = (len(distance), weight, _invariant(cone[2], local_edges))
+            for entry in classes.setdefault(key, []):
+                if isomorphic(entry[0], cone):
+                    entry[1] += 1
+                    break
+            else:
+                labels = {n:i for i, n in enumerate(sorted(distance))}
+                classes[key].append([cone, 1, self._local_simulator(labels, local_edges, labels[fr], labels[to], weight)])
+
+        self.classes = [(count, simulator) for entries in classes.values() for cone, count, simulator in entries]
+
+    def _local_simulator(self, labels, local_edges, fr, to, weight):
+        num_bits = len(labels)
+        edges = [common.Edge(labels[a], labels[b], w) for (a, b), w in local_edges.items()]
+        simulator = StatevectorSimulator(common.Graph(set(range(num_bits)), edges, num_bits), symmetric=True)
+        root = common.Graph(set([fr, to]), [common.Edge(fr, to, weight)], num_bits)
+        return simulator, cut_diagonal(root, symmetric=True)
+
+    def expected_cut(self, rounds):
+        assert(len(rounds) == self.num_rounds)
+        total = 0.0
+        for count, (simulator, observable) in self.classes:
+            total += count*simulator.expected_cut(rounds, observable)
+        return total
+
+    def gradient(self, rounds):
+        assert(len(rounds) == self.num_rounds)
+        value = 0.0
+        grad = [{'beta':0.0, 'gamma':0.0} for r in rounds]
+        for count, (simulator, observable) in self.classes:
+            v, g = simulator.gradient(rounds, observable)
+            value += count*v
+            for total, local in zip(grad, g):
+                total['beta'] += count*local['beta']
+                total['gamma'] += count*local['gamma']
+        return value, grad
+
+
+# evaluator interface of sweep.py, simulators are built per number of rounds
+class LightConeEvaluator(object):
+    def __init__(self, graph):
+        self.graph = graph
+        self._simulators = {}
+
+    def __getstate__(self):
+        return {'graph':self.graph, '_simulators':{}}
+
+    def settings(self):
+        return {'evaluator':'statevector'}
+
+    def simulator(self, num_rounds):
+        if not num_rounds in self._simulators:
+            self._simulators[num_rounds] = LightConeSimulator(self.graph, num_rounds)
+        return self._simulators[num_rounds]
+
+    def __call__(self, rounds):
+        return self.simulator(len(rounds)).expected_cut(rounds), None
+
+    def batch(self, rounds_list):
+        return [self(rounds) for rounds in rounds_list]
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import os, re, sys, argparse, json, csv, tracemalloc, resource
+
+from multiprocessing import Pool
+
+import common
+import sweep
+import optimize
+import exact
+import warmstart
+import profiling
+
+# runs the configure, execute and baseline steps on every graph of a
+# directory and writes one row per graph, graphs run in parallel
+
+columns = [
+    'graph', 'nodes', 'edges', 'rounds', 'optimizer',
+    'load_time', 'configure_time', 'execute_time', 'baseline_time', 'time_to_solution',
+    'expected_cut', 'sampled_cut', 'random_cut', 'max_cut',
+    'approximation_ratio', 'sampled_ratio', 'random_ratio',
+    'peak_memory_mb', 'max_rss_mb'
+]
+
+graph_name_pattern = re.compile(r'^(\d+)_(\d+)_(\w+)\.qx$')
+
+
+# graphs ordered by size when they follow <max_node>_<num_edge>_<id>.qx
+def graph_files(directory):
+    files = [f for f in os.listdir(directory) if f.endswith('.qx')]
+    def key(f):
+        match = graph_name_pattern.match(f)
+        if match is None:
+            return (1, 0, 0, f)
+        return (0, int(match.group(1)), int(match.group(2)), f)
+    return [os.path.join(directory, f) for f in sorted(files, key=key)]
+
+
+def name_max_node(file_name):
+    match = graph_name_pattern.match(os.path.basename(file_name))
+    return None if match is None else int(match.group(1))
+
+
+# the warm started local search of maxcut-qaoa-configure.py on exact
+# simulators, returns the angles and expected cut of the last round
+def configure(args, graph):
+    simulators = warmstart.simulators(graph, args.light_cone, args.symmetric)
+    evaluate = lambda rounds: simulators(len(rounds)).expected_cut(rounds)
+    rounds, value = warmstart.search(graph, args.optimizer, args.rounds, args.iterations, evaluate, simulators,
+        args.analytic, args.sample_range_scale, args.random_seed)
+    return rounds, value, simulators(args.rounds)
+
+
+# samples the configured circuit, on a qiskit backend when one is given and
+# from the statevector otherwise, returns None when neither applies
+def execute(args, graph, rounds, simulator):
+    if args.backend is not None:
+        evaluator = sweep.CircuitEvaluator(graph, args.shots, args.backend)
+        return evaluator(rounds)[0]
+    if args.light_cone:
+        return None
+    counts = simulator.counts(rounds, args.shots, args.random_seed, packed=True)
+    return common.expected_cut(graph, counts)
+
+
+def benchmark(args, graph_file):
+    # tracing slows every allocation, so it only runs with --memory and the
+    # timers of those rows include it, --profile-memory may already be
+    # tracing the whole run
+    tracing = tracemalloc.is_tracing()
+    if args.memory:
+        if tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+    row = {'graph':os.path.basename(graph_file), 'rounds':args.rounds, 'optimizer':args.optimizer}
+
+    with profiling.timer('load graph') as t:
+        graph = common.load_graph(graph_file, args.use_cache)
+    row['load_time'] = t.elapsed
+    row['nodes'] = len(graph.nodes)
+    row['edges'] = len(graph.edges)
+
+    with profiling.timer('configure') as t:
+        rounds, row['expected_cut'], simulator = configure(args, graph)
+    row['configure_time'] = t.elapsed
+
+    with profiling.timer('execute') as t:
+        row['sampled_cut'] = execute(args, graph, rounds, simulator)
+    row['execute_time'] = t.elapsed
+    row['time_to_solution'] = row['configure_time'] + row['execute_time']
+
+    with profiling.timer('baseline') as t:
+        rand_cut_dist = common.rand_cut_dist(graph, args.random_samples, args.random_seed)
+        row['random_cut'] = sum([cv*prob for (cv,prob) in rand_cut_dist.items()])
+        row['max_cut'] = None
+        if graph.max_node <= args.exact_max_nodes:
+            row['max_cut'] = exact.max_cut(graph)[0]
+    row['baseline_time'] = t.elapsed
+
+    for key, ratio in [('expected_cut', 'approximation_ratio'), ('sampled_cut', 'sampled_ratio'), ('random_cut', 'random_ratio')]:
+        row[ratio] = None
+        if row['max_cut'] and row[key] is not None:
+            row[ratio] = row[key]/row['max_cut']
+
+    row['peak_memory_mb'] = None
+    if args.memory:
+        row['peak_memory_mb'] = tracemalloc.get_traced_memory()[1]/2**20
+        if not tracing:
+            tracemalloc.stop()
+    # the high water mark carries over between graphs run in one process, it
+    # is only filled in by workers that run a single graph
+    row['max_rss_mb'] = None
+
+    return row
+
+
+_args = None
+
+def _init_worker(args):
+    global _args
+    _args = args
+
+
+# worker timers and counters are sent back with each row, each worker runs
+# one graph so its high water mark is the graph's
+def _run_benchmark(graph_file):
+    row = benchmark(_args, graph_file)
+    # kilobytes on linux
+    row['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/2**10
+    data = profiling.snapshot()
+    profiling.reset()
+    return row, data
+
+
+class RowWriter(object):
+    def __init__(self, file, format):
+        self.file = file
+        self.format = format
+        if format == 'csv':
+            self.writer = csv.DictWriter(file, fieldnames=columns)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == 'csv':
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row, sort_keys=True) + '\n')
+        self.file.flush()
+
+
+def main(args):
+    files = graph_files(args.directory)
+    files = [f for f in files if args.max_nodes is None or name_max_node(f) is None or name_max_node(f) <= args.max_nodes]
+    print('graphs: {}'.format(len(files)), file=sys.stderr)
+    print('workers: {}'.format(args.workers), file=sys.stderr)
+
+    if args.output is None:
+        file = sys.stdout
+    else:
+        file = open(args.output, 'w')
+
+    try:
+        writer = RowWriter(file, args.format)
+        if args.workers <= 1:
+            for f in files:
+                writer.write(benchmark(args, f))
+        else:
+            with Pool(args.workers, initializer=_init_worker, initargs=(args,), maxtasksperchild=1) as pool:
+                # rows are written in graph order as they complete
+                for row, data in pool.imap(_run_benchmark, files):
+                    profiling.merge(data)
+                    writer.write(row)
+    finally:
+        if file is not sys.stdout:
+            file.close()
+
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('directory', help='a directory of graph data files to operate on (.qx)')
+
+    parser.add_argument('-r', '--rounds', help='number of angle rounds to apply', type=int, default=1)
+    parser.add_argument('-o', '--optimizer', help='the local angle search method, warm started round by round', choices=optimize.methods, default='gradient')
+    parser.add_argument('-it', '--iterations', help='iterations of the local optimizer per round', type=int, default=200)
+    parser.add_argument('-sy', '--symmetric', help='stores only half of the statevector using the bit flip symmetry of maxcut', action='store_true', default=False)
+    parser.add_argument('-lcn', '--light-cone', help='computes exact expected cuts edge by edge on their light cones, for large sparse graphs', action='store_true', default=False)
+    parser.add_argument('-an', '--analytic', help='solves the first 2 rounds from the closed form expectation and warm starts the optimizer from them', action='store_true', default=False)
+    parser.add_argument('-srs', '--sample-range-scale', help='scales the starting angles of the search', type=float, default=1.0)
+
+    parser.add_argument('-be', '--backend', help='samples the configured circuit on this qiskit backend instead of the statevector', choices=['local_qasm_simulator','ibmqx2','ibmqx4','ibmqx5','ibmqx_qasm_simulator'])
+    parser.add_argument('-sh', '--shots', help='number of samples of the configured circuit', type=int, default=1024)
+
+    parser.add_argument('-rsa', '--random-samples', help='number of random assignments for the baseline cut distribution', type=int, default=100000)
+    parser.add_argument('-rs', '--random-seed', help='the seed of the random number generator', type=int, default=0)
+    parser.add_argument('-exn', '--exact-max-nodes', help='computes the maximum cut exactly for graphs up to this many nodes', type=int, default=24)
+    parser.add_argument('-mn', '--max-nodes', help='skips graphs whose name gives more nodes than this', type=int)
+
+    parser.add_argument('-w', '--workers', help='number of processes running graphs, each graph gets a fresh process and a max_rss_mb when this is above 1', type=int, default=1)
+    parser.add_argument('-mem', '--memory', help='traces allocations for the peak_memory_mb column, this slows the timed steps', action='store_true', default=False)
+    parser.add_argument('-uc', '--use-cache', help='loads graphs through their .npz cache files', action='store_true', default=False)
+
+    parser.add_argument('-out', '--output', help='the file to write rows to, stdout by default')
+    parser.add_argument('-f', '--format', help='the row format', choices=['csv', 'jsonl'], default='csv')
+
+    profiling.add_cli_arguments(parser)
+
+    return parser
+
+
+if __name__ == '__main__':
+    parser = build_cli_parser()
+    args = parser.parse_args()
+    # rows may go to stdout, the profile goes to stderr like the other messages
+    profiling.enable_from_args(args, sys.stderr)
+    main(args)
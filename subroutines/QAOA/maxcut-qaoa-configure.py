@@ -1,20 +1,27 @@
 #!/usr/bin/env python3
 
-import sys, argparse, json
+import os, sys, time, signal, argparse, json, itertools
 
 from math import pi
-from qiskit import QuantumProgram
 
-import common
+import numpy as np
 
-beta_template = 'b{:02d}'
-gamma_template = 'g{:02d}'
+import common
+import sweep
+import optimize
+import cache
+import lightcone
+import analytic
+import warmstart
+import profiling
+from circuit import beta_template, gamma_template
 
 def main(args):
     print('')
     print('working on: {}'.format(args.graph))
 
-    graph = common.load_graph(args.graph)
+    with profiling.timer('load graph'):
+        graph = common.load_graph(args.graph)
     print('graph ({},{})'.format(len(graph.nodes), len(graph.edges)))
 
     if args.remap:
@@ -28,12 +35,22 @@ def main(args):
     print('steps: {}'.format(args.steps))
     print('shots: {}'.format(args.shots))
 
+    if args.optimizer != 'grid':
+        with profiling.timer('optimize'):
+            optimize_angles(args, graph)
+        return
+
     beta_vals = [value for value in common.frange(0.0, args.sample_range_scale*pi, args.steps, include_start=False)]
     gamma_vals = [value for value in common.frange(0.0, args.sample_range_scale*2.0*pi, args.steps, include_start=False)]
 
     print('beta: {}'.format(beta_vals))
     print('gamma: {}'.format(gamma_vals))
 
+    if args.analytic:
+        with profiling.timer('analytic grid'):
+            analytic_grid(args, graph, beta_vals, gamma_vals)
+        return
+
     names = []
     values = {}
 
@@ -47,93 +64,182 @@ def main(args):
         values[gn] = gamma_vals
 
 
-    best_config = None
-    best_config_value = 0
+    evaluator = build_evaluator(args, graph)
 
-    for config in common.dfs(names, values, {}):
-        #print(config)
+    num_configs = len(beta_vals)**args.rounds * len(gamma_vals)**args.rounds
+    print('configurations: {}'.format(num_configs))
+    print('workers: {}'.format(args.workers))
+
+    configs = (config_rounds(config, args.rounds) for config in common.dfs(names, values, {}))
+    chunksize = sweep.chunk_size(num_configs, args.workers)
+
+    checkpoint_file = config_file_name(args.graph, args.rounds).replace('.json', '.checkpoint')
+    checkpoint_settings = {
+        'graph': common.graph_hash(graph),
+        'rounds': args.rounds,
+        'steps': args.steps,
+        'sample_range_scale': args.sample_range_scale,
+        'evaluator': evaluator.settings()
+    }
 
-        num_bits = graph.max_node
+    progress = sweep.Progress()
+    best = sweep.Best()
+    if args.resume and os.path.exists(checkpoint_file):
+        progress, best = sweep.load_checkpoint(checkpoint_file, checkpoint_settings)
+        print('resuming: {} of {} configurations done'.format(progress.completed, num_configs))
+        print('best so far: {}'.format(best.rounds))
+        print('expected cut: {}'.format(best.value))
+    configs = itertools.islice(configs, progress.completed, None)
+
+    if args.checkpoint_interval > 0:
+        print('checkpoint: {}'.format(checkpoint_file))
+        # preempted jobs get a SIGTERM, this lets the final checkpoint be written
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+    last_checkpoint = time.time()
+    finished = False
+    try:
+        with profiling.timer('grid sweep'):
+            for index, rounds, ec, counts in sweep.run(evaluator, configs, args.workers, chunksize, progress.completed):
+                profiling.count('configurations evaluated')
+                progress.done(index)
+                if best.update(index, rounds, ec):
+                    print('')
+                    print('new best: {}'.format(best.rounds))
+                    print('expected cut: {}'.format(best.value))
+                    if counts is not None:
+                        print('counts: {}'.format(counts))
+                else:
+                    sys.stdout.write('.')
+                    sys.stdout.flush()
+
+                if args.checkpoint_interval > 0 and time.time() - last_checkpoint >= args.checkpoint_interval:
+                    sweep.save_checkpoint(checkpoint_file, checkpoint_settings, progress, best)
+                    last_checkpoint = time.time()
+        finished = True
+    finally:
+        if not finished and args.checkpoint_interval > 0:
+            sweep.save_checkpoint(checkpoint_file, checkpoint_settings, progress, best)
+            print('')
+            print('interrupted after {} of {} configurations, checkpoint: {}'.format(progress.completed, num_configs, checkpoint_file))
+
+    json_config = {
+        'steps': args.steps,
+        'expected_cut': best.value,
+        'rounds': best.rounds
+    }
+    write_config(args.graph, json_config)
+
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+
+
+# the grid sweep of one or two rounds from the closed form expectation, only
+# gamma of round 0 and beta of round 1 change the result so the sweep is the
+# (beta, gamma) landscape, which is also written out as a table
+def analytic_grid(args, graph, beta_vals, gamma_vals):
+    assert args.rounds <= 2, 'the analytic expectation covers at most 2 rounds'
+    print('simulator: analytic')
+    landscape = analytic.SingleLayerLandscape(graph)
+
+    rounds = [{'beta':beta_vals[0], 'gamma':gamma_vals[0]} for r in range(args.rounds)]
+    if args.rounds < 2:
+        value = landscape.rounds_expected_cut(rounds)
+    else:
+        beta, gamma = np.meshgrid(beta_vals, gamma_vals, indexing='ij')
+        values = landscape.expected_cut(beta, gamma)
+
+        landscape_file = config_file_name(args.graph, args.rounds).replace('_config_', '_landscape_').replace('.json', '.csv')
+        print('write: {}'.format(landscape_file))
+        with open(landscape_file, 'w') as file:
+            file.write('beta,gamma,expected_cut\n')
+            for b, g, v in zip(beta.ravel(), gamma.ravel(), values.ravel()):
+                file.write('{},{},{}\n'.format(b, g, v))
+
+        # the angles that do not change the result stay at their first values
+        i, j = np.unravel_index(np.argmax(values), values.shape)
+        rounds[0]['gamma'] = gamma_vals[j]
+        rounds[1]['beta'] = beta_vals[i]
+        value = float(values[i, j])
+
+    print('')
+    print('best: {}'.format(rounds))
+    print('expected cut: {}'.format(value))
 
-        qp = QuantumProgram()
-        qr = qp.create_quantum_register('qr', num_bits)
-        cr = qp.create_classical_register('cr', num_bits)
-        qc = qp.create_circuit('qaoa', [qr], [cr])
+    json_config = {
+        'steps': args.steps,
+        'expected_cut': value,
+        'rounds': rounds
+    }
+    write_config(args.graph, json_config)
 
-        for i in range(num_bits):
-            qc.h(qr[i])
 
-        for r in range(args.rounds):
-            beta = config[beta_template.format(r)]
-            gamma = config[gamma_template.format(r)]
+def optimize_angles(args, graph):
+    print('optimizer: {}'.format(args.optimizer))
+    print('iterations: {}'.format(args.iterations))
 
-            for i in range(num_bits):
-                qc.u3(2*beta, -pi/2, pi/2, qr[i])
+    simulators = None
+    evaluate = None
+    if args.optimizer == 'gradient':
+        print('simulator: {}'.format('light cone' if args.light_cone else 'statevector'))
+        simulators = warmstart.simulators(graph, args.light_cone, args.symmetric)
+    else:
+        evaluator = build_evaluator(args, graph)
+        evaluate = lambda rounds: evaluator(rounds)[0]
 
-            for e in graph.edges:
-                qc.x(qr[e.fr])
-                qc.u1(-gamma/2.0, qr[e.fr])
-                qc.x(qr[e.fr])
-                qc.u1(-gamma/2.0, qr[e.fr])
-                qc.cx(qr[e.fr], qr[e.to])
-                qc.x(qr[e.to])
-                qc.u1(gamma/2.0, qr[e.to])
-                qc.x(qr[e.to])
-                qc.u1(-gamma/2.0, qr[e.to])
-                qc.cx(qr[e.fr], qr[e.to])
+    def write_rounds(p, rounds, value):
+        print('')
+        print('rounds {}: {}'.format(p, rounds))
+        print('expected cut: {}'.format(value))
 
-        qc.measure(qr, cr)
+        json_config = {
+            'optimizer': args.optimizer,
+            'iterations': args.iterations,
+            'expected_cut': value,
+            'rounds': rounds
+        }
+        write_config(args.graph, json_config)
 
-        result = qp.execute(['qaoa'], backend='local_qasm_simulator', shots=args.shots)
+    warmstart.search(graph, args.optimizer, args.rounds, args.iterations, evaluate, simulators,
+        args.analytic, args.sample_range_scale, args.random_seed, write_rounds)
 
-        # Show the results
-        #print(result)
-        data = result.get_data('qaoa')
-        #print(data['counts'])
-        ec = common.expected_cut(graph, data['counts'])
-        #print(ec)
-        #print(result.get_ran_qasm('qaoa'))
 
-        if ec > best_config_value:
-            best_config = config
-            best_config_value = ec
+def build_evaluator(args, graph):
+    if args.light_cone:
+        print('simulator: light cone')
+        evaluator = lightcone.LightConeEvaluator(graph)
+    elif args.statevector:
+        print('simulator: statevector')
+        evaluator = sweep.StatevectorEvaluator(graph, args.symmetric)
+    else:
+        evaluator = sweep.CircuitEvaluator(graph, args.shots)
 
-            print('')
-            print('new best: {}'.format(best_config))
-            print('expected cut: {}'.format(best_config_value))
-            print('counts: {}'.format(data['counts']))
-        else:
-            sys.stdout.write('.')
-            sys.stdout.flush()
+    if args.cache is not None:
+        max_bytes = None
+        if args.cache_size is not None:
+            max_bytes = int(args.cache_size*2**20)
+        print('cache: {}{}'.format(args.cache, ' (read only)' if args.cache_read_only else ''))
+        evaluation_cache = cache.EvaluationCache(args.cache, max_bytes, args.cache_read_only)
+        evaluator = cache.CachedEvaluator(evaluator, evaluation_cache)
 
-        #print(nodes)
-        #print(edges)
+    return evaluator
 
-        # print_err('loading: {}'.format(args.sample_data))
-        # with open(args.sample_data) as file:
-        #     data = json.load(file)
 
-        # for solution_data in data['solutions']:
-        #     row = [solution_data['num_occurrences']] + solution_data['solution']
-        #     print(', '.join([str(x) for x in row]))
+def config_file_name(graph_file, rounds):
+    return graph_file.replace('.qx', '_config_{:02d}.json'.format(rounds))
 
-    json_config = {
-        'steps': args.steps,
-        'expected_cut': best_config_value, 
-        'rounds':[]
-    }
-    rounds = json_config['rounds']
-    for r in range(args.rounds):
-        beta = config[beta_template.format(r)]
-        gamma = config[gamma_template.format(r)]
-        rounds.append({'beta':beta, 'gamma':gamma})
 
-    config_file = args.graph.replace('.qx', '_config_{:02d}.json'.format(args.rounds))
+def write_config(graph_file, json_config):
+    config_file = config_file_name(graph_file, len(json_config['rounds']))
     print('write: {}'.format(config_file))
     with open(config_file, 'w') as file:
         file.write(json.dumps(json_config, **common.json_dumps_kwargs))
 
 
+def config_rounds(config, rounds):
+    return [{'beta':config[beta_template.format(r)], 'gamma':config[gamma_template.format(r)]} for r in range(rounds)]
+
+
 def build_cli_parser():
     parser = argparse.ArgumentParser()
 
@@ -147,11 +253,31 @@ def build_cli_parser():
     parser.add_argument('-srs', '--sample-range-scale', help='reduces the total range for angle steps', type=float, default=1.0)
 
     parser.add_argument('-sh', '--shots', help='number of replicates for each configuration', type=int, default=1000)
+    parser.add_argument('-sy', '--symmetric', help='stores only half of the statevector using the bit flip symmetry of maxcut', action='store_true', default=False)
+    parser.add_argument('-lcn', '--light-cone', help='computes exact expected cuts edge by edge on their light cones, for large sparse graphs', action='store_true', default=False)
+    parser.add_argument('-an', '--analytic', help='uses the closed form expectation for up to 2 rounds, as the whole grid sweep or to warm start the optimizers', action='store_true', default=False)
+    parser.add_argument('-w', '--workers', help='number of processes evaluating configurations', type=int, default=1)
+    parser.add_argument('-sv', '--statevector', help='computes exact expected cuts with the statevector simulator instead of sampling circuits', action='store_true', default=False)
+
+    parser.add_argument('-c', '--cache', help='a directory for caching evaluated configurations')
+    parser.add_argument('-cs', '--cache-size', help='evicts least recently used cache entries beyond this size (MB)', type=float)
+    parser.add_argument('-cro', '--cache-read-only', help='uses existing cache entries without adding new ones', action='store_true', default=False)
+
+    parser.add_argument('-ci', '--checkpoint-interval', help='seconds between checkpoints of the sweep position and best configuration, 0 disables checkpoints', type=float, default=60.0)
+    parser.add_argument('-re', '--resume', help='continues the sweep from its checkpoint file', action='store_true', default=False)
+
+    parser.add_argument('-o', '--optimizer', help='the angle search method, the local optimizers warm start each round from the previous one', choices=['grid']+optimize.methods, default='grid')
+    parser.add_argument('-it', '--iterations', help='iterations of the local optimizer per round', type=int, default=200)
+    parser.add_argument('-rs', '--random-seed', help='the seed of the random number generator', type=int, default=0)
+
+    profiling.add_cli_arguments(parser)
 
     return parser
 
 
 if __name__ == '__main__':
     parser = build_cli_parser()
-    main(parser.parse_args())
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+    main(args)
 
@@ -2,18 +2,24 @@
 
 import sys, argparse, json
 
-from math import pi
 from qiskit import QuantumProgram
 
 import common
+import circuit
+import exact
+import results
+import profiling
+import jobs
 
 def main(args):
     print('')
     print('working on: {}'.format(args.graph))
     print('with configuration: {}'.format(args.config))
 
-    graph = common.load_graph(args.graph)
+    with profiling.timer('load graph'):
+        graph = common.load_graph(args.graph)
     print('graph ({},{})'.format(len(graph.nodes), len(graph.edges)))
+    print('total weight: {}'.format(sum(e.weight for e in graph.edges)))
 
     if args.remap:
         print('')
@@ -25,47 +31,27 @@ def main(args):
     with open(args.config, 'r') as file:
         config = json.load(file)
 
+    rounds = config['rounds']
+    timing = {}
+
     print('')
     print('config:')
     print('  rounds: {}'.format(len(config['rounds'])))
 
-    num_bits = graph.max_node
-
-    qp = QuantumProgram()
-    qr = qp.create_quantum_register('qr', num_bits)
-    cr = qp.create_classical_register('cr', num_bits)
-    qc = qp.create_circuit('qaoa', [qr], [cr])
-
-    for i in range(num_bits):
-        qc.h(qr[i])
-
-    for r in config['rounds']:
-        beta = r['beta']
-        gamma = r['gamma']
-
-        for i in range(num_bits):
-            qc.u3(2*beta, -pi/2, pi/2, qr[i])
-
-        for e in graph.edges:
-            qc.x(qr[e.fr])
-            qc.u1(-gamma/2.0, qr[e.fr])
-            qc.x(qr[e.fr])
-            qc.u1(-gamma/2.0, qr[e.fr])
-            qc.cx(qr[e.fr], qr[e.to])
-            qc.x(qr[e.to])
-            qc.u1(gamma/2.0, qr[e.to])
-            qc.x(qr[e.to])
-            qc.u1(-gamma/2.0, qr[e.to])
-            qc.cx(qr[e.fr], qr[e.to])
-
-    qc.measure(qr, cr)
+    with profiling.timer('build circuit') as t:
+        template = circuit.QAOATemplate(graph, len(config['rounds']), args.legacy_circuit)
+        qp = QuantumProgram()
+        circuit.build_qaoa(qp, graph, config['rounds'], template=template)
+    timing['build'] = t.elapsed
+    print('  gates: {}'.format(len(template.gates)))
+    print('  depth: {}'.format(circuit.depth(template.gates)))
 
 
     print('')
     print('execute:')
     backend_name = args.backend
 
-    if not 'local' in backend_name:
+    if not 'local' in backend_name and backend_name != 'mock':
         with open('_config') as data_file:
             config = json.load(data_file)
         assert('qx_token' in config)
@@ -79,11 +65,16 @@ def main(args):
 
 
     print('  shots: {}'.format(args.shots))
-    result = qp.execute(['qaoa'], backend=backend_name, shots=args.shots)
-
-    # Show the results
-    #print(result)
-    data = result.get_data('qaoa')
+    with profiling.timer('execute') as t:
+        if 'local' in backend_name:
+            result = qp.execute(['qaoa'], backend=backend_name, shots=args.shots)
+            # Show the results
+            #print(result)
+            data = result.get_data('qaoa')
+            ran_qasm = result.get_ran_qasm('qaoa')
+        else:
+            data, ran_qasm = run_job(args, qp, graph, rounds, template)
+    timing['execute'] = t.elapsed
 
     print('')
     print('data:')
@@ -91,46 +82,127 @@ def main(args):
         if k != 'counts':
             print('{}: {}'.format(k, v))
 
+    with profiling.timer('post processing') as t:
+        # the bit strings are packed once, only the printed ones are unpacked
+        counts = common.sorted_counts(common.packed_counts(data['counts'], graph.max_node))
+        assert len(counts.states) > 0, 'the backend returned no counts'
+        cvs, weights = common.counts_cut_values(graph, counts, args.symmetric)
+        cut_dist = common.values_cut_dist(cvs, weights)
+        # with symmetric the cut values are of the merged states, the listed
+        # states are evaluated on their own
+        if args.symmetric:
+            state_cut_values = common.cut_values(graph, counts.states[:51])
+        else:
+            state_cut_values = cvs[:51]
+        ec = sum([cv*prob for (cv,prob) in cut_dist.items()])
+    timing['post_processing'] = t.elapsed
+
     print('')
     print('result:')
     print('  state dist.:')
-    for i, state in enumerate(sorted(data['counts'].keys(), key=lambda x: data['counts'][x], reverse=True)):
-        assignment = common.str2vals(state)
-        cv = common.cut_value(graph, assignment)
-        print('  {} - {} - {}'.format(cv, state, data['counts'][state]))
+    shown = common.unpack_states(counts.states[:51], counts.num_bits)
+    for i, (state, cv, count) in enumerate(zip(shown, state_cut_values, counts.counts)):
+        print('  {} - {} - {}'.format(cv, state, count))
         if i >= 50:
-            print('first 50 of {} states'.format(len(data['counts'])))
+            print('first 50 of {} states'.format(len(counts.states)))
             break
 
     print('')
     print('  cut dist.:')
-    cut_dist = common.cut_dist(graph, data['counts'])
     for i, cv in enumerate(sorted(cut_dist.keys(), reverse=True)):
         print('  {} - {}'.format(cv, cut_dist[cv]))
         if i >= 20:
             print('first 20 of {} cut values'.format(len(cut_dist)))
             break
 
-    ec = sum([cv*prob for (cv,prob) in cut_dist.items()])
     print('  expected cut value: {}'.format(ec))
 
-    samples = 100000
+    with profiling.timer('random baseline') as t:
+        rand_cut_dist = common.rand_cut_dist(graph, args.random_samples, args.random_seed)
+        rand_ec = sum([cv*prob for (cv,prob) in rand_cut_dist.items()])
+    timing['baseline'] = t.elapsed
+
     print('')
-    print('  rand cut dist. ({}):'.format(samples))
-    rand_cut_dist = common.rand_cut_dist(graph, samples)
+    print('  rand cut dist. ({}):'.format(args.random_samples))
     for i, cv in enumerate(sorted(rand_cut_dist.keys(), reverse=True)):
         print('  {} - {}'.format(cv, rand_cut_dist[cv]))
         if i >= 20:
             print('first 20 of {} cut values'.format(len(rand_cut_dist)))
             break
 
+    if args.exact:
+        with profiling.timer('exact max cut') as t:
+            max_cut, assignment = exact.max_cut(graph, args.workers)
+        timing['exact'] = t.elapsed
+        print('')
+        print('  max cut value: {}'.format(max_cut))
+        print('  max cut assignment: {}'.format(assignment))
+        # a graph without positive edges has nothing to approximate
+        if max_cut:
+            print('  approximation ratio: {}'.format(ec/max_cut))
+            print('  rand approximation ratio: {}'.format(rand_ec/max_cut))
+
+    if args.output is not None:
+        fields = {
+            'graph': args.graph,
+            'graph_hash': common.graph_hash(graph),
+            'nodes': len(graph.nodes),
+            'edges': len(graph.edges),
+            'config': args.config,
+            'rounds': rounds,
+            'backend': backend_name,
+            'shots': args.shots,
+            'symmetric': args.symmetric,
+            'legacy_circuit': args.legacy_circuit,
+            'gates': len(template.gates),
+            'depth': circuit.depth(template.gates),
+            'data': {k:v for k,v in data.items() if k != 'counts'},
+            'expected_cut': ec,
+            'random_samples': args.random_samples,
+            'random_seed': args.random_seed,
+            'rand_expected_cut': rand_ec,
+            'timing': timing
+        }
+        if args.exact:
+            fields['max_cut'] = max_cut
+            fields['max_cut_assignment'] = assignment
+        record = results.run_record(data['counts'], cut_dist, rand_cut_dist, **fields)
+        print('')
+        print('write: {}'.format(args.output))
+        with profiling.timer('write output'):
+            results.write(args.output, graph, record, counts)
+
     if args.show_qasm:
         print('')
-        print(result.get_ran_qasm('qaoa'))
+        print(ran_qasm)
 
     #print('')
 
 
+# remote circuits go through the job manager, a rerun with the same job store
+# waits for the already submitted job instead of queueing it again
+def run_job(args, qp, graph, rounds, template):
+    if args.backend == 'mock':
+        # a remote backend stand in sampling the statevector
+        from simulator import StatevectorSimulator
+        simulator = StatevectorSimulator(graph)
+        client = jobs.MockClient(sampler=lambda qasm, shots: simulator.counts(rounds, shots, args.random_seed))
+        qasm = template.bind(rounds)
+    else:
+        client = jobs.QXClient(qp.get_api())
+        qobj = qp.compile(['qaoa'], backend=args.backend, shots=args.shots)
+        qasm = qp.get_compiled_qasm(qobj, 'qaoa')
+
+    job_store = args.job_store
+    if job_store is None:
+        job_store = args.config.replace('.json', '') + '.jobs.json'
+    print('  job store: {}'.format(job_store))
+
+    manager = jobs.JobManager(client, jobs.JobStore(job_store), poll_interval=args.poll_interval, timeout=args.job_timeout)
+    data = manager.run([('qaoa', qasm)], args.backend, args.shots)['qaoa']
+    return data, qasm
+
+
 def build_cli_parser():
     parser = argparse.ArgumentParser()
 
@@ -139,15 +211,33 @@ def build_cli_parser():
 
     parser.add_argument('-rm', '--remap', help='renames given qbits to 0..n-1', action='store_true', default=False)
 
-    parser.add_argument('-be', '--backend', default='local_qasm_simulator', choices=['local_qasm_simulator','ibmqx2','ibmqx4','ibmqx5','ibmqx_qasm_simulator'], help='the methods for solving the quantum program')
+    parser.add_argument('-be', '--backend', default='local_qasm_simulator', choices=['local_qasm_simulator','ibmqx2','ibmqx4','ibmqx5','ibmqx_qasm_simulator','mock'], help='the methods for solving the quantum program, mock stands in for a remote backend')
     parser.add_argument('-sh', '--shots', help='number of replicates for each configuration', type=int, default=1024)
 
+    parser.add_argument('-js', '--job-store', help='a json file keeping remote job ids for reruns, defaults to the config file name with .jobs.json')
+    parser.add_argument('-jt', '--job-timeout', help='seconds to wait for a remote job before giving up (it keeps its job id)', type=float, default=240.0)
+    parser.add_argument('-pi', '--poll-interval', help='seconds before the first remote status poll, doubling up to 30', type=float, default=5.0)
+
+    parser.add_argument('-rsa', '--random-samples', help='number of random assignments for the baseline cut distribution', type=int, default=100000)
+    parser.add_argument('-rs', '--random-seed', help='the seed of the random number generator', type=int, default=0)
+
+    parser.add_argument('-sy', '--symmetric', help='merges complementary states before evaluating cuts', action='store_true', default=False)
+
+    parser.add_argument('-ex', '--exact', help='computes the maximum cut exactly and reports approximation ratios', action='store_true', default=False)
+    parser.add_argument('-w', '--workers', help='number of processes for the exact maximum cut', type=int, default=1)
+
+    parser.add_argument('-lc', '--legacy-circuit', help='emits the original 10 gate edge terms instead of the compiled cost layers', action='store_true', default=False)
+    parser.add_argument('-out', '--output', help='writes the full results of the run, appended as a json line, or as columns to a .npz file that holds this run only and is overwritten')
     parser.add_argument('-sq', '--show-qasm', help='prints executed qasm', action='store_true', default=False)
 
+    profiling.add_cli_arguments(parser)
+
     return parser
 
 
 if __name__ == '__main__':
     parser = build_cli_parser()
-    main(parser.parse_args())
+    args = parser.parse_args()
+    profiling.enable_from_args(args)
+    main(args)
 
@@ -0,0 +1,97 @@
+import numpy as np
+
+# local angle search, all optimizers maximize the objective and work on
+# vectors of the form [beta_0, gamma_0, beta_1, gamma_1, ...]
+
+methods = ['nelder-mead', 'spsa', 'gradient']
+
+
+def vector2rounds(x):
+    return [{'beta':float(x[2*r]), 'gamma':float(x[2*r+1])} for r in range(len(x)//2)]
+
+
+def rounds2vector(rounds):
+    return np.array([v for r in rounds for v in (r['beta'], r['gamma'])], dtype=np.float64)
+
+
+def nelder_mead(f, x0, iterations=200, step=0.1, tol=1e-8):
+    dim = len(x0)
+    simplex = [np.array(x0, dtype=np.float64)]
+    for i in range(dim):
+        x = np.array(x0, dtype=np.float64)
+        x[i] += step
+        simplex.append(x)
+    values = [f(x) for x in simplex]
+
+    for it in range(iterations):
+        order = np.argsort(values)[::-1]
+        simplex = [simplex[i] for i in order]
+        values = [values[i] for i in order]
+        if values[0] - values[-1] < tol:
+            break
+
+        centroid = np.mean(simplex[:-1], axis=0)
+        reflected = centroid + (centroid - simplex[-1])
+        reflected_value = f(reflected)
+
+        if reflected_value > values[0]:
+            expanded = centroid + 2.0*(centroid - simplex[-1])
+            expanded_value = f(expanded)
+            if expanded_value > reflected_value:
+                simplex[-1], values[-1] = expanded, expanded_value
+            else:
+                simplex[-1], values[-1] = reflected, reflected_value
+        elif reflected_value > values[-2]:
+            simplex[-1], values[-1] = reflected, reflected_value
+        else:
+            contracted = centroid + 0.5*(simplex[-1] - centroid)
+            contracted_value = f(contracted)
+            if contracted_value > values[-1]:
+                simplex[-1], values[-1] = contracted, contracted_value
+            else:
+                for i in range(1, len(simplex)):
+                    simplex[i] = simplex[0] + 0.5*(simplex[i] - simplex[0])
+                    values[i] = f(simplex[i])
+
+    best = int(np.argmax(values))
+    return simplex[best], values[best]
+
+
+# simultaneous perturbation stochastic approximation, two evaluations per
+# iteration regardless of the number of angles, which suits sampled objectives
+def spsa(f, x0, iterations=200, a=0.2, c=0.1, seed=None):
+    rng = np.random.default_rng(seed)
+    x = np.array(x0, dtype=np.float64)
+    stability = 0.1*iterations
+    for k in range(iterations):
+        ak = a/(k + 1 + stability)**0.602
+        ck = c/(k + 1)**0.101
+        delta = rng.choice([-1.0, 1.0], size=len(x))
+        grad = (f(x + ck*delta) - f(x - ck*delta))/(2.0*ck*delta)
+        x = x + ak*grad
+    return x, f(x)
+
+
+# gradient ascent with a backtracking line search, fg returns (value, gradient)
+def gradient_ascent(fg, x0, iterations=200, step=0.1, tol=1e-8):
+    x = np.array(x0, dtype=np.float64)
+    value, grad = fg(x)
+    for it in range(iterations):
+        norm = np.dot(grad, grad)
+        if norm < tol:
+            break
+        t = step
+        while True:
+            x_new = x + t*grad
+            value_new, grad_new = fg(x_new)
+            if value_new >= value + 1e-4*t*norm or t < 1e-10:
+                break
+            t *= 0.5
+        if value_new <= value:
+            break
+        improvement = value_new - value
+        x, value, grad = x_new, value_new, grad_new
+        step = 2.0*t
+        if improvement < tol:
+            break
+    return x, value
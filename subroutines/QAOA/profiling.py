@@ -0,0 +1,111 @@
+import sys, time, atexit
+
+from contextlib import contextmanager
+
+# timers and counters shared by the qaoa scripts. recording is always on and
+# only costs a dict update, the scripts' --profile flags print the summary
+# table at exit and optionally capture cProfile and tracemalloc data
+
+_timers = {}
+_counters = {}
+
+
+class Timer(object):
+    def __init__(self, name):
+        self.name = name
+        self.elapsed = 0.0
+
+
+# accumulates the wall time of the block under name, the yielded Timer holds
+# the time of this block once it exits
+@contextmanager
+def timer(name):
+    t = Timer(name)
+    start = time.perf_counter()
+    try:
+        yield t
+    finally:
+        t.elapsed = time.perf_counter() - start
+        calls, total = _timers.get(name, (0, 0.0))
+        _timers[name] = (calls+1, total+t.elapsed)
+
+
+def count(name, n=1):
+    _counters[name] = _counters.get(name, 0) + n
+
+
+# the recorded data as plain dicts, so worker processes can return it
+def snapshot():
+    return {'timers':dict(_timers), 'counters':dict(_counters)}
+
+
+def reset():
+    _timers.clear()
+    _counters.clear()
+
+
+def merge(data):
+    for name, (calls, total) in data['timers'].items():
+        c, t = _timers.get(name, (0, 0.0))
+        _timers[name] = (c+calls, t+total)
+    for name, n in data['counters'].items():
+        count(name, n)
+
+
+def report(file=sys.stdout):
+    print('', file=file)
+    print('profile:', file=file)
+    if len(_timers) > 0:
+        print('  {:<32} {:>8} {:>12} {:>12}'.format('timer', 'calls', 'total (s)', 'mean (s)'), file=file)
+        for name, (calls, total) in sorted(_timers.items(), key=lambda x: -x[1][1]):
+            print('  {:<32} {:>8} {:>12.6f} {:>12.6f}'.format(name, calls, total, total/calls), file=file)
+    if len(_counters) > 0:
+        print('  {:<32} {:>8}'.format('counter', 'value'), file=file)
+        for name, n in sorted(_counters.items()):
+            print('  {:<32} {:>8}'.format(name, n), file=file)
+
+
+# starts the requested captures and prints everything at exit
+def enable(cprofile_file=None, memory=False, file=sys.stdout):
+    profiler = None
+    if cprofile_file is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    def finish():
+        report(file)
+
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            print('', file=file)
+            print('memory:', file=file)
+            print('  peak: {:.3f} MB'.format(peak/2**20), file=file)
+            for stat in tracemalloc.take_snapshot().statistics('lineno')[:10]:
+                print('  {}'.format(stat), file=file)
+            tracemalloc.stop()
+
+        if profiler is not None:
+            import pstats
+            profiler.disable()
+            profiler.dump_stats(cprofile_file)
+            print('', file=file)
+            print('cprofile: {}'.format(cprofile_file), file=file)
+            pstats.Stats(profiler, stream=file).sort_stats('cumulative').print_stats(20)
+
+    atexit.register(finish)
+
+
+def add_cli_arguments(parser):
+    parser.add_argument('-pf', '--profile', help='prints timers and counters of the run at exit', action='store_true', default=False)
+    parser.add_argument('-pfc', '--profile-cprofile', help='also captures a cProfile of the run into this file')
+    parser.add_argument('-pfm', '--profile-memory', help='also traces memory allocations and reports the peak and top sites', action='store_true', default=False)
+
+
+def enable_from_args(args, file=sys.stdout):
+    if args.profile or args.profile_cprofile is not None or args.profile_memory:
+        enable(args.profile_cprofile, args.profile_memory, file)
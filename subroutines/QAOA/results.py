@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+
+import common
+
+# structured results of maxcut-qaoa-execute.py runs. a record is a dict of
+# json values with the full counts and distributions of one run, .jsonl
+# files get one record appended per run and .npz files hold one run as
+# columns (packed states, counts, cut values) next to the remaining fields
+
+
+def _dist_columns(dist):
+    values = sorted(dist.keys(), reverse=True)
+    return values, [dist[cv] for cv in values]
+
+
+def run_record(counts, cut_dist, rand_cut_dist, **fields):
+    record = dict(fields)
+    record['counts'] = counts
+    record['cut_dist'] = [[cv, p] for cv, p in zip(*_dist_columns(cut_dist))]
+    record['rand_cut_dist'] = [[cv, p] for cv, p in zip(*_dist_columns(rand_cut_dist))]
+    return record
+
+
+def append_jsonl(file_name, record):
+    with open(file_name, 'a') as file:
+        file.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+# counts may be given as common.Counts to skip packing the record's counts
+def write_columns(file_name, graph, record, counts=None):
+    if counts is None:
+        counts = common.packed_counts(record['counts'], graph.max_node)
+    columns = {
+        'states': counts.states,
+        'state_counts': counts.counts,
+        'state_cut_values': common.cut_values(graph, counts.states)
+    }
+    for name in ['cut_dist', 'rand_cut_dist']:
+        values = [cv for cv, p in record[name]]
+        columns[name+'_values'] = np.array(values, dtype=np.int64 if all(isinstance(cv, int) for cv in values) else np.float64)
+        columns[name+'_probs'] = np.array([p for cv, p in record[name]], dtype=np.float64)
+
+    fields = {k:v for k, v in record.items() if not k in ['counts', 'cut_dist', 'rand_cut_dist']}
+    np.savez(file_name, fields=np.array(json.dumps(fields, sort_keys=True)), **columns)
+
+
+def write(file_name, graph, record, counts=None):
+    if file_name.endswith('.npz'):
+        write_columns(file_name, graph, record, counts)
+    else:
+        append_jsonl(file_name, record)
@@ -0,0 +1,130 @@
+import numpy as np
+
+import common
+import profiling
+
+
+# the cut value, the initial |+>^n state and the mixer are all invariant under
+# flipping every bit, so the amplitudes of a state and its complement stay
+# equal. with symmetric=True only the states whose last bit is 0 are stored,
+# the complement of state s in this half is the reversed index 2^(n-1)-1-s
+
+
+# cut value of every (stored) basis state, the cost layer is diagonal in this
+# basis
+def cut_diagonal(graph, symmetric=False):
+    num_bits = graph.max_node - 1 if symmetric else graph.max_node
+    states = np.arange(2**num_bits, dtype=np.uint64)
+    return common.cut_values(graph, states).astype(np.float64)
+
+
+# applies exp(-i beta X) to every qubit, this is the u3(2*beta, -pi/2, pi/2)
+# mixer used in the qiskit circuits
+def apply_mixer(psi, num_bits, beta, symmetric=False):
+    c = np.cos(beta)
+    s = -1j*np.sin(beta)
+    for i in range(num_bits-1 if symmetric else num_bits):
+        view = psi.reshape(-1, 2, 2**i)
+        a = view[:, 0, :].copy()
+        b = view[:, 1, :]
+        view[:, 0, :] = c*a + s*b
+        view[:, 1, :] = s*a + c*b
+    if symmetric:
+        # flipping the last bit maps to the complement of the other bits
+        psi[:] = c*psi + s*psi[::-1]
+    return psi
+
+
+# applies the mixer generator, the sum of X over all qubits
+def apply_x_sum(psi, num_bits, symmetric=False):
+    out = np.zeros_like(psi)
+    for i in range(num_bits-1 if symmetric else num_bits):
+        out.reshape(-1, 2, 2**i)[...] += psi.reshape(-1, 2, 2**i)[:, ::-1, :]
+    if symmetric:
+        out += psi[::-1]
+    return out
+
+
+# the edge terms of the circuits apply exp(-i gamma cut) up to a global phase
+def apply_cost(psi, diagonal, gamma):
+    psi *= np.exp(-1j*gamma*diagonal)
+    return psi
+
+
+class StatevectorSimulator(object):
+    def __init__(self, graph, symmetric=False):
+        self.graph = graph
+        self.num_bits = graph.max_node
+        self.symmetric = symmetric and graph.max_node > 0
+        # each stored amplitude stands for this many basis states
+        self.multiplicity = 2 if self.symmetric else 1
+        self.diagonal = cut_diagonal(graph, self.symmetric)
+
+    # the stored amplitudes, normalized over the full register
+    # rounds is a list of {'beta':..., 'gamma':...} as in the config files
+    def state(self, rounds):
+        profiling.count('statevector runs')
+        dim = 2**self.num_bits
+        psi = np.full(dim//self.multiplicity, 1.0/np.sqrt(dim), dtype=np.complex128)
+        for r in rounds:
+            apply_mixer(psi, self.num_bits, r['beta'], self.symmetric)
+            apply_cost(psi, self.diagonal, r['gamma'])
+        return psi
+
+    def _stored_probabilities(self, rounds):
+        psi = self.state(rounds)
+        return psi.real**2 + psi.imag**2
+
+    # probabilities of all 2^n basis states
+    def probabilities(self, rounds):
+        probs = self._stored_probabilities(rounds)
+        if self.symmetric:
+            probs = np.concatenate((probs, probs[::-1]))
+        return probs
+
+    # the observable is a diagonal over the stored states and defaults to the
+    # cut value, which is also the cost of the circuit
+    def expected_cut(self, rounds, observable=None):
+        if observable is None:
+            observable = self.diagonal
+        return self.multiplicity*float(np.dot(self._stored_probabilities(rounds), observable))
+
+    # expected cut (or observable) and its exact gradient by adjoint
+    # differentiation, the gradient is a list of {'beta':..., 'gamma':...}
+    # matching rounds
+    def gradient(self, rounds, observable=None):
+        if observable is None:
+            observable = self.diagonal
+        psi = self.state(rounds)
+        lam = self.multiplicity*observable*psi
+        value = float(np.vdot(psi, lam).real)
+
+        grad = [None]*len(rounds)
+        for i in reversed(range(len(rounds))):
+            r = rounds[i]
+            d_gamma = 2.0*np.vdot(lam, -1j*self.diagonal*psi).real
+            apply_cost(psi, self.diagonal, -r['gamma'])
+            apply_cost(lam, self.diagonal, -r['gamma'])
+
+            d_beta = 2.0*np.vdot(lam, -1j*apply_x_sum(psi, self.num_bits, self.symmetric)).real
+            apply_mixer(psi, self.num_bits, -r['beta'], self.symmetric)
+            apply_mixer(lam, self.num_bits, -r['beta'], self.symmetric)
+
+            grad[i] = {'beta':float(d_beta), 'gamma':float(d_gamma)}
+
+        return value, grad
+
+    # samples measurement outcomes in the same form as the qiskit counts
+    # {bit string: count} like a backend, or common.Counts with packed=True
+    def counts(self, rounds, shots, seed=None, packed=False):
+        probs = self._stored_probabilities(rounds)
+        rng = np.random.default_rng(seed)
+        states = rng.choice(len(probs), size=shots, p=probs/probs.sum())
+        if self.symmetric:
+            # each sample is the stored state or its complement with equal probability
+            states = states ^ (rng.integers(0, 2, size=shots)*(2**self.num_bits-1))
+        states, samples = np.unique(states, return_counts=True)
+        counts = common.Counts(states.astype(np.uint64), samples.astype(np.int64), self.num_bits)
+        if packed:
+            return counts
+        return common.counts_dict(counts)
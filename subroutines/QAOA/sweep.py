@@ -0,0 +1,202 @@
+import os, json, itertools, tempfile
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import common
+import profiling
+
+
+# evaluators map a list of rounds to (expected cut, counts), counts is None
+# when the evaluator does not sample, batch evaluates many configurations at
+# once and returns a list of these pairs
+
+class CircuitEvaluator(object):
+    def __init__(self, graph, shots, backend='local_qasm_simulator'):
+        self.graph = graph
+        self.shots = shots
+        self.backend = backend
+        self._templates = {}
+
+    # templates are rebuilt in each worker rather than pickled
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_templates'] = {}
+        return state
+
+    def settings(self):
+        return {'evaluator':'circuit', 'backend':self.backend, 'shots':self.shots}
+
+    def template(self, num_rounds):
+        if not num_rounds in self._templates:
+            import circuit
+            self._templates[num_rounds] = circuit.QAOATemplate(self.graph, num_rounds)
+        return self._templates[num_rounds]
+
+    def __call__(self, rounds):
+        return self.batch([rounds])[0]
+
+    # all circuits of a batch are submitted in a single execute call
+    def batch(self, rounds_list):
+        # qiskit is only needed by workers that build circuits
+        from qiskit import QuantumProgram
+        import circuit
+
+        qp = QuantumProgram()
+        names = []
+        for i, rounds in enumerate(rounds_list):
+            name = 'qaoa{}'.format(i)
+            circuit.build_qaoa(qp, self.graph, rounds, name, self.template(len(rounds)))
+            names.append(name)
+        result = qp.execute(names, backend=self.backend, shots=self.shots)
+
+        results = []
+        for name in names:
+            counts = result.get_data(name)['counts']
+            results.append((common.expected_cut(self.graph, counts), counts))
+        return results
+
+
+class StatevectorEvaluator(object):
+    def __init__(self, graph, symmetric=False):
+        self.graph = graph
+        self.symmetric = symmetric
+        self._simulator = None
+
+    # the cut diagonal is rebuilt in each worker rather than pickled
+    def __getstate__(self):
+        return {'graph':self.graph, 'symmetric':self.symmetric, '_simulator':None}
+
+    def settings(self):
+        return {'evaluator':'statevector'}
+
+    def simulator(self):
+        if self._simulator is None:
+            from simulator import StatevectorSimulator
+            self._simulator = StatevectorSimulator(self.graph, self.symmetric)
+        return self._simulator
+
+    def __call__(self, rounds):
+        return self.simulator().expected_cut(rounds), None
+
+    def batch(self, rounds_list):
+        return [self(rounds) for rounds in rounds_list]
+
+
+_evaluator = None
+
+def _init_worker(evaluator):
+    global _evaluator
+    _evaluator = evaluator
+
+
+def _evaluate_chunk(chunk):
+    values = _evaluator.batch([rounds for index, rounds in chunk])
+    return [(index, rounds, ec, counts) for ((index, rounds), (ec, counts)) in zip(chunk, values)]
+
+
+# worker timers and counters are sent back with each chunk
+def _run_chunk(chunk):
+    results = _evaluate_chunk(chunk)
+    data = profiling.snapshot()
+    profiling.reset()
+    return results, data
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+# evaluates every configuration and yields (index, rounds, expected cut, counts)
+# as results arrive, index is the position of the configuration in the input
+# (offset by start) so callers can break ties in enumeration order
+def run(evaluator, configs, workers=1, chunksize=1, start=0):
+    items = enumerate(configs, start)
+
+    chunks = _chunks(items, chunksize)
+
+    if workers <= 1:
+        _init_worker(evaluator)
+        for chunk in chunks:
+            for result in _evaluate_chunk(chunk):
+                yield result
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(evaluator,)) as executor:
+        # only a bounded number of chunks are in flight, so large grids are
+        # never materialized
+        pending = set(executor.submit(_run_chunk, chunk) for chunk in itertools.islice(chunks, 2*workers))
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, data = future.result()
+                profiling.merge(data)
+                for result in results:
+                    yield result
+                for chunk in itertools.islice(chunks, 1):
+                    pending.add(executor.submit(_run_chunk, chunk))
+
+
+def chunk_size(num_configs, workers):
+    return max(1, min(256, num_configs//(8*max(1, workers))))
+
+
+# keeps the best configuration, ties go to the earliest configuration so the
+# result does not depend on the order in which workers finish
+class Best(object):
+    def __init__(self):
+        self.index = None
+        self.rounds = None
+        self.value = None
+
+    def update(self, index, rounds, value):
+        if self.index is None or value > self.value or (value == self.value and index < self.index):
+            self.index = index
+            self.rounds = rounds
+            self.value = value
+            return True
+        return False
+
+
+# tracks how many leading configurations are evaluated, results arrive out
+# of order so only this contiguous prefix is safe to skip on resume
+class Progress(object):
+    def __init__(self, completed=0):
+        self.completed = completed
+        self._done = set()
+
+    def done(self, index):
+        self._done.add(index)
+        while self.completed in self._done:
+            self._done.remove(self.completed)
+            self.completed += 1
+
+
+def save_checkpoint(file_name, settings, progress, best):
+    data = {
+        'settings': settings,
+        'completed': progress.completed,
+        'best': {'index':best.index, 'rounds':best.rounds, 'value':best.value}
+    }
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        file.write(json.dumps(data, **common.json_dumps_kwargs))
+    os.rename(tmp_name, file_name)
+
+
+def load_checkpoint(file_name, settings):
+    with open(file_name, 'r') as file:
+        data = json.load(file)
+    assert data['settings'] == settings, 'checkpoint {} was written with different settings'.format(file_name)
+
+    progress = Progress(data['completed'])
+    best = Best()
+    best.index = data['best']['index']
+    best.rounds = data['best']['rounds']
+    best.value = data['best']['value']
+    return progress, best
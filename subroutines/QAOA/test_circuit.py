@@ -0,0 +1,85 @@
+import random, unittest
+
+import numpy as np
+
+import common
+import circuit
+from simulator import StatevectorSimulator
+from test_expected_cut import random_graph, random_rounds
+
+# the compiled and legacy gate lists of circuit.py applied gate by gate, with
+# the qiskit gate definitions, against the statevector simulator
+
+
+def gate_matrix(gate, params):
+    angles = [a.coeff*params[a.param] if isinstance(a, circuit.Angle) else {'-pi/2':-np.pi/2, 'pi/2':np.pi/2}[a] for a in gate.angles]
+    if gate.name == 'h':
+        return np.array([[1, 1], [1, -1]])/np.sqrt(2)
+    if gate.name == 'x':
+        return np.array([[0, 1], [1, 0]])
+    if gate.name == 'u1':
+        return np.diag([1, np.exp(1j*angles[0])])
+    if gate.name == 'u3':
+        theta, phi, lam = angles
+        return np.array([
+            [np.cos(theta/2), -np.exp(1j*lam)*np.sin(theta/2)],
+            [np.exp(1j*phi)*np.sin(theta/2), np.exp(1j*(phi+lam))*np.cos(theta/2)]
+        ])
+    raise ValueError('unknown gate {}'.format(gate.name))
+
+
+# bit q of the basis state index is qubit q, as in the simulator
+def run_gates(gates, num_bits, rounds):
+    params = circuit.round_params(rounds)
+    psi = np.zeros((2,)*num_bits, dtype=np.complex128)
+    psi[(0,)*num_bits] = 1.0
+    for gate in gates:
+        # axis num_bits-1-q of the reshaped state holds qubit q
+        axes = [num_bits-1-q for q in gate.qubits]
+        if gate.name == 'cx':
+            control, target = axes
+            index = [slice(None)]*num_bits
+            index[control] = 1
+            sub = psi[tuple(index)]
+            target_axis = target if target < control else target-1
+            psi[tuple(index)] = np.flip(sub, axis=target_axis)
+        else:
+            psi = np.moveaxis(np.tensordot(gate_matrix(gate, params), np.moveaxis(psi, axes[0], 0), axes=1), 0, axes[0])
+    psi = psi.reshape(-1)
+    return psi.real**2 + psi.imag**2
+
+
+# the legacy edge term of a self loop is cx(q, q), which is not a gate
+def without_self_loops(graph):
+    return common.Graph(graph.nodes, [e for e in graph.edges if e.fr != e.to], graph.max_node)
+
+
+class CircuitTest(unittest.TestCase):
+    def test_matches_statevector(self):
+        rng = random.Random(0)
+        for num_nodes in [3, 5, 7]:
+            graph = random_graph(rng, num_nodes, num_nodes)
+            simulator = StatevectorSimulator(graph)
+            for num_rounds in [1, 2, 3]:
+                rounds = random_rounds(rng, num_rounds)
+                expected = simulator.probabilities(rounds)
+                gates = circuit.qaoa_gates(graph, num_rounds)
+                self.assertTrue(np.allclose(run_gates(gates, num_nodes, rounds), expected))
+                gates = circuit.qaoa_gates(without_self_loops(graph), num_rounds, legacy=True)
+                self.assertTrue(np.allclose(run_gates(gates, num_nodes, rounds), expected))
+
+    # the peephole pass keeps the legacy circuit's distribution with fewer
+    # gates, a zero weight edge gives zero rotations that it drops
+    def test_merge_gates(self):
+        rng = random.Random(1)
+        graph = without_self_loops(random_graph(rng, 6, 6))
+        graph = common.Graph(graph.nodes, graph.edges + [common.Edge(1, 4, 0.0)], graph.max_node)
+        rounds = random_rounds(rng, 2)
+        gates = circuit.qaoa_gates(graph, 2, legacy=True)
+        merged = circuit.merge_gates(gates)
+        self.assertLess(len(merged), len(gates))
+        self.assertTrue(np.allclose(run_gates(merged, 6, rounds), StatevectorSimulator(graph).probabilities(rounds)))
+
+
+if __name__ == '__main__':
+    unittest.main()
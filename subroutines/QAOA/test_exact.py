@@ -0,0 +1,45 @@
+import random, itertools, unittest
+
+import common
+import exact
+
+# exact.max_cut against trying every assignment, with small blocks so the
+# gray code walk and its per node deltas do most of the work
+
+
+def random_graph(rng, num_nodes, num_edges, weighted):
+    edges = []
+    for i in range(num_edges):
+        fr, to = rng.sample(range(num_nodes), 2)
+        weight = rng.choice([0.5, 1.0, 2.5, -1.0]) if weighted else 1.0
+        edges.append(common.Edge(fr, to, weight))
+    # every node is used so max_node matches the node count
+    edges.extend(common.Edge(i, (i+1) % num_nodes, 1.0) for i in range(num_nodes))
+    nodes = set(e.fr for e in edges) | set(e.to for e in edges)
+    return common.Graph(nodes, edges, num_nodes)
+
+
+def brute_force_max_cut(graph):
+    return max(common.cut_value(graph, assignment) for assignment in itertools.product([0, 1], repeat=graph.max_node))
+
+
+class MaxCutTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        for num_nodes in range(2, 11):
+            for weighted in [False, True]:
+                graph = random_graph(rng, num_nodes, 2*num_nodes, weighted)
+                expected = brute_force_max_cut(graph)
+                for block_bits in [0, 2, 18]:
+                    value, assignment = exact.max_cut(graph, block_bits=block_bits)
+                    self.assertAlmostEqual(value, expected)
+                    self.assertAlmostEqual(common.cut_value(graph, assignment), expected)
+
+    def test_workers(self):
+        graph = random_graph(random.Random(1), 12, 30, True)
+        value, assignment = exact.max_cut(graph, workers=2, block_bits=3)
+        self.assertAlmostEqual(value, brute_force_max_cut(graph))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import random, itertools, unittest
+
+import numpy as np
+
+import common
+import lightcone
+import analytic
+
+# the light cone simulator and the closed form landscape against a brute force
+# statevector of the full circuit on small random weighted graphs
+
+
+def random_graph(rng, num_nodes, num_edges):
+    edges = [common.Edge(i, (i+1) % num_nodes, rng.choice([0.5, 1.0, 2.0])) for i in range(num_nodes)]
+    for i in range(num_edges):
+        fr, to = rng.sample(range(num_nodes), 2)
+        edges.append(common.Edge(fr, to, rng.choice([0.5, 1.0, 1.5, 3.0])))
+    # a self loop and a parallel edge, both are merged away
+    edges.append(common.Edge(0, 0, 1.0))
+    edges.append(common.Edge(edges[0].to, edges[0].fr, 0.25))
+    nodes = set(e.fr for e in edges) | set(e.to for e in edges)
+    return common.Graph(nodes, edges, num_nodes)
+
+
+# every round applies exp(-i beta X) to each qubit and then exp(-i gamma w) to
+# the cut states of each edge, starting from |+>^n
+def brute_force_expected_cut(graph, rounds):
+    n = graph.max_node
+    states = list(itertools.product([0, 1], repeat=n))
+    cuts = np.array([common.cut_value(graph, s) for s in states], dtype=np.float64)
+    psi = np.full(2**n, 2**(-n/2.0), dtype=np.complex128)
+    for r in rounds:
+        mixer = np.array([[np.cos(r['beta']), -1j*np.sin(r['beta'])], [-1j*np.sin(r['beta']), np.cos(r['beta'])]])
+        for q in range(n):
+            psi = np.moveaxis(np.tensordot(mixer, np.moveaxis(psi.reshape((2,)*n), q, 0), axes=1), 0, q).reshape(-1)
+        psi = psi*np.exp(-1j*r['gamma']*cuts)
+    return float(np.dot(np.abs(psi)**2, cuts))
+
+
+def random_rounds(rng, num_rounds):
+    return [{'beta':rng.uniform(-np.pi, np.pi), 'gamma':rng.uniform(-np.pi, np.pi)} for r in range(num_rounds)]
+
+
+class LightConeTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        for num_nodes in [4, 6, 8]:
+            graph = random_graph(rng, num_nodes, num_nodes)
+            evaluator = lightcone.LightConeEvaluator(graph)
+            for num_rounds in [1, 2, 3]:
+                rounds = random_rounds(rng, num_rounds)
+                self.assertAlmostEqual(evaluator.simulator(num_rounds).expected_cut(rounds), brute_force_expected_cut(graph, rounds))
+
+    # all cones of a cycle are isomorphic, so one is simulated for all edges
+    def test_isomorphic_cones(self):
+        graph = common.Graph(set(range(8)), [common.Edge(i, (i+1) % 8, 1.0) for i in range(8)], 8)
+        rounds = random_rounds(random.Random(1), 3)
+        simulator = lightcone.LightConeEvaluator(graph).simulator(3)
+        self.assertEqual(len(simulator.classes), 1)
+        self.assertAlmostEqual(simulator.expected_cut(rounds), brute_force_expected_cut(graph, rounds))
+
+    # complete graphs have cones with every node symmetric, these must not
+    # make the isomorphism search enumerate their labelings
+    def test_dense_graphs(self):
+        rng = random.Random(2)
+        for num_nodes in [7, 8]:
+            graph = common.Graph(set(range(num_nodes)), [common.Edge(i, j, 1.0) for i in range(num_nodes) for j in range(i+1, num_nodes)], num_nodes)
+            for num_rounds in [2, 3]:
+                rounds = random_rounds(rng, num_rounds)
+                simulator = lightcone.LightConeEvaluator(graph).simulator(num_rounds)
+                self.assertEqual(len(simulator.classes), 1)
+                self.assertAlmostEqual(simulator.expected_cut(rounds), brute_force_expected_cut(graph, rounds))
+
+        # two weights on a complete graph, the cones split into a few classes
+        graph = common.Graph(set(range(7)), [common.Edge(i, j, 1.0 + (i+j) % 2) for i in range(7) for j in range(i+1, 7)], 7)
+        rounds = random_rounds(rng, 2)
+        self.assertAlmostEqual(lightcone.LightConeEvaluator(graph).simulator(2).expected_cut(rounds), brute_force_expected_cut(graph, rounds))
+
+
+class AnalyticTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        for num_nodes in [3, 5, 7]:
+            graph = random_graph(rng, num_nodes, num_nodes)
+            landscape = analytic.SingleLayerLandscape(graph)
+            for num_rounds in [1, 2]:
+                rounds = random_rounds(rng, num_rounds)
+                self.assertAlmostEqual(landscape.rounds_expected_cut(rounds), brute_force_expected_cut(graph, rounds))
+
+    def test_broadcast(self):
+        graph = random_graph(random.Random(2), 5, 6)
+        landscape = analytic.SingleLayerLandscape(graph)
+        beta, gamma = np.meshgrid([0.1, 0.7], [0.3, -1.2, 2.0], indexing='ij')
+        values = landscape.expected_cut(beta, gamma)
+        for i, j in itertools.product(range(2), range(3)):
+            rounds = [{'beta':0.0, 'gamma':gamma[i, j]}, {'beta':beta[i, j], 'gamma':0.0}]
+            self.assertAlmostEqual(values[i, j], brute_force_expected_cut(graph, rounds))
+
+
+if __name__ == '__main__':
+    unittest.main()
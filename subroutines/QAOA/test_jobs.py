@@ -0,0 +1,94 @@
+import os, io, json, tempfile, unittest
+
+from contextlib import redirect_stdout
+
+import jobs
+
+# runs the job manager against the local mock backend, with short latencies
+# and poll intervals so the whole file takes about a second
+
+qasm = 'OPENQASM 2.0;\ninclude "qelib1.inc";\nqreg q[3];\ncreg c[3];\nh q;\nmeasure q -> c;\n'
+circuits = [('circuit_{}'.format(i), qasm) for i in range(3)]
+
+
+# fails the first job it is polled for
+class FailingClient(jobs.MockClient):
+    def __init__(self, *args, **kwargs):
+        super(FailingClient, self).__init__(*args, **kwargs)
+        self.failed = set()
+
+    def poll(self, job_id):
+        if len(self.failed) == 0 or job_id in self.failed:
+            self.failed.add(job_id)
+            return 'ERROR_RUNNING_JOB', None
+        return super(FailingClient, self).poll(job_id)
+
+
+class JobManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store_file = os.path.join(self.directory.name, 'jobs.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_manager(self, manager, circuits=circuits, shots=64):
+        with redirect_stdout(io.StringIO()):
+            return manager.run(circuits, 'mock', shots)
+
+    def test_submit_and_complete(self):
+        client = jobs.MockClient(latency=(0.0, 0.05), seed=0)
+        manager = jobs.JobManager(client, poll_interval=0.01)
+        results = self.run_manager(manager)
+
+        self.assertEqual(sorted(results.keys()), [name for name, q in circuits])
+        for data in results.values():
+            self.assertEqual(sum(data['counts'].values()), 64)
+            self.assertTrue(all(len(state) == 3 for state in data['counts']))
+        self.assertEqual(client.submitted, len(circuits))
+
+    def test_backoff(self):
+        client = jobs.MockClient(latency=(0.3, 0.3), seed=0)
+        manager = jobs.JobManager(client, poll_interval=0.01, max_poll_interval=0.08, backoff=2.0)
+        self.run_manager(manager, circuits[:1])
+
+        # 0.01, 0.02, 0.04, then 0.08 until the job is ready, a fixed interval
+        # would poll about 30 times
+        self.assertLessEqual(client.polls, 8)
+
+    def test_resume_from_store(self):
+        client = jobs.MockClient(latency=(0.2, 0.2), seed=0)
+        manager = jobs.JobManager(client, jobs.JobStore(self.store_file), poll_interval=0.01, timeout=0.0)
+        with self.assertRaises(TimeoutError):
+            self.run_manager(manager, circuits[:1])
+
+        with open(self.store_file) as file:
+            stored = json.load(file)
+        self.assertEqual([entry['status'] for entry in stored.values()], ['RUNNING'])
+
+        # a new manager on the same store waits for the submitted job
+        manager = jobs.JobManager(client, jobs.JobStore(self.store_file), poll_interval=0.01)
+        results = self.run_manager(manager, circuits[:1])
+        self.assertEqual(client.submitted, 1)
+
+        # and completed jobs are read from the store without polling
+        polls = client.polls
+        manager = jobs.JobManager(client, jobs.JobStore(self.store_file), poll_interval=0.01)
+        self.assertEqual(self.run_manager(manager, circuits[:1]), results)
+        self.assertEqual(client.polls, polls)
+
+    def test_failed_job_is_resubmitted(self):
+        client = FailingClient(latency=(0.0, 0.0), seed=0)
+        manager = jobs.JobManager(client, jobs.JobStore(self.store_file), poll_interval=0.01)
+        with self.assertRaises(RuntimeError):
+            self.run_manager(manager, circuits[:1])
+        self.assertEqual([entry['status'] for entry in jobs.JobStore(self.store_file).jobs.values()], ['ERROR_RUNNING_JOB'])
+
+        manager = jobs.JobManager(client, jobs.JobStore(self.store_file), poll_interval=0.01)
+        results = self.run_manager(manager, circuits[:1])
+        self.assertEqual(client.submitted, 2)
+        self.assertEqual(sum(results[circuits[0][0]]['counts'].values()), 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+from math import pi
+
+import numpy as np
+
+import sweep
+import optimize
+import lightcone
+import analytic
+
+# the round by round angle search of maxcut-qaoa-configure.py and
+# maxcut-qaoa-benchmark.py
+
+
+# the exact simulators of the gradient search, as a function of the number
+# of rounds
+def simulators(graph, light_cone=False, symmetric=False):
+    if light_cone:
+        return lightcone.LightConeEvaluator(graph).simulator
+    simulator = sweep.StatevectorEvaluator(graph, symmetric).simulator()
+    return lambda num_rounds: simulator
+
+
+# searches angles one round at a time, round p+1 starts from the best round p
+# angles with the last round repeated. evaluate maps rounds to the expected
+# cut for the gradient free methods, the gradient method runs on simulators.
+# with use_analytic rounds 1 and 2 are solved from the closed form expectation
+# and the search starts at round 3 from these angles. callback(p, rounds,
+# value) is called after every round, returns the rounds and value of the last
+def search(graph, method, num_rounds, iterations, evaluate=None, simulators=None, use_analytic=False, sample_range_scale=1.0, seed=None, callback=None):
+    def objective(x):
+        return evaluate(optimize.vector2rounds(x))
+
+    def objective_gradient(x):
+        rounds = optimize.vector2rounds(x)
+        value, grad = simulators(len(rounds)).gradient(rounds)
+        return value, optimize.rounds2vector(grad)
+
+    if use_analytic:
+        landscape = analytic.SingleLayerLandscape(graph)
+
+    x = np.array([sample_range_scale*pi/8.0, sample_range_scale*pi/4.0])
+    for p in range(1, num_rounds+1):
+        if p > 1:
+            x = np.concatenate((x, x[-2:]))
+
+        if use_analytic and p == 1:
+            value = landscape.total_weight/2.0
+        elif use_analytic and p == 2:
+            beta, gamma, value = landscape.maximize(iterations=iterations)
+            x = np.array([x[0], gamma, beta, gamma])
+        elif method == 'nelder-mead':
+            x, value = optimize.nelder_mead(objective, x, iterations)
+        elif method == 'spsa':
+            x, value = optimize.spsa(objective, x, iterations, seed=seed)
+        else:
+            x, value = optimize.gradient_ascent(objective_gradient, x, iterations)
+
+        if callback is not None:
+            callback(p, optimize.vector2rounds(x), value)
+
+    return optimize.vector2rounds(x), value
@@ -4,6 +4,12 @@ from qiskit import QuantumProgram
 import math
 from Qconfig import api_token, url
 import json
+import os
+import sys
+
+# the job manager of the qaoa scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'QAOA'))
+import jobs
 
 ''' 3 qubit Grover's algorithm with known marked element.  I am heavily borrowing from 
 https://gitlab.lanl.gov/QuantumProgramming2017/q-network-flows/blob/master/Grover/grover3.py
@@ -118,11 +124,13 @@ if __name__ == '__main__':
     simulator = 'ibmqx4'
     shots = 1000
     timeout = 240
+    qp = QuantumProgram()
+    qr = qp.create_quantum_register("qr", 3)
+    cr = qp.create_classical_register("cr", 3)
+    runs = []
     for marked_int in range(8):
-        qp = QuantumProgram()
-        qr = qp.create_quantum_register("qr", 3)
-        cr = qp.create_classical_register("cr", 3)
-        qc = qp.create_circuit("qc", [qr], [cr])
+        name = "qc%d"%marked_int
+        qc = qp.create_circuit(name, [qr], [cr])
         # build the program
         # marked search
         # algorithm = 'Grover Marked'
@@ -138,10 +146,21 @@ if __name__ == '__main__':
         print("%s for %d with %d iterations"%(algorithm, value, n))
         grover_search(qc, qr, n_iterations=n, oracle=grover_oracle_minima, value=value)
         qc.measure(qr, cr)
-        qp.set_api(api_token, url)
-        # run
-        result = qp.execute(["qc"], backend=simulator, shots=shots, timeout=timeout, silent=False)
-        data = result.get_data("qc")
+        runs.append((name, algorithm, value, n))
+    qp.set_api(api_token, url)
+    # run, all circuits are submitted at once and polled together, the job ids
+    # are kept in grover_jobs.json so a rerun picks up unfinished jobs
+    names = [run[0] for run in runs]
+    if 'local' in simulator:
+        result = qp.execute(names, backend=simulator, shots=shots, timeout=timeout, silent=False)
+        results = {name: result.get_data(name) for name in names}
+    else:
+        qobj = qp.compile(names, backend=simulator, shots=shots)
+        circuits = [(name, qp.get_compiled_qasm(qobj, name)) for name in names]
+        manager = jobs.JobManager(jobs.QXClient(qp.get_api()), jobs.JobStore('grover_jobs.json'), poll_interval=5, timeout=timeout)
+        results = manager.run(circuits, simulator, shots)
+    for name, algorithm, value, n in runs:
+        data = results[name]
         print(data['counts'])
         data['Algorithm'] = algorithm
         data['Value'] = value
@@ -5,6 +5,13 @@
 import math
 import random
 import argparse
+import collections
+import multiprocessing
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
 
 __author__ = "Todd Wildey"
 __copyright__ = "Copyright 2013"
@@ -179,6 +186,79 @@ class QubitRegister:
 
 		return amplitudes
 
+####################################################################################################
+#                                                                                                   
+#                                           Array engine                                            
+#                                                                                                   
+####################################################################################################
+
+# The same circuit with amplitudes kept in numpy arrays.  The input register
+# only matters through the output register it is entangled with and through
+# the QFT of its amplitudes once the output is measured, so only these are
+# kept: a^x mod N for every input state, the output register probabilities,
+# and the conditioned input register.
+
+# Uses one random number and the same cumulative search as
+# QubitRegister.measure, the probabilities are overwritten by their sums
+def measureProbabilities(probabilities):
+	measure = random.random()
+	np.cumsum(probabilities, out = probabilities)
+	i = int(np.searchsorted(probabilities, measure, side = 'right'))
+	if i >= len(probabilities):
+		return None
+
+	return i
+
+def arrayMeasurements(a, N, Q):
+	assert np is not None, 'the array engine requires numpy'
+
+	# The Hadamard leaves every x at amplitude 1/sqrt(Q), so an output state
+	# has the probability of its number of preimages
+	values = modExpTable(a, N).values(Q)
+	counts = np.bincount(values, minlength = N)
+
+	printInfo("Performing a measurement on the output register")
+
+	y = measureProbabilities(counts / float(Q))
+
+	printInfo("Output register measured\ty = " + str(y))
+
+	if y is None:
+		return None, None
+
+	# The input register is left uniform over the preimages of y.  The
+	# transform of qft(), exp(-2 pi i x k / Q) / sqrt(Q), is numpy's forward
+	# FFT with orthonormal scaling.  The amplitudes are real, so only the
+	# first half of the spectrum is computed and |F(Q - k)| = |F(k)|
+	amplitudes = (values == y).astype(np.float64)
+	del values
+	amplitudes /= math.sqrt(counts[y])
+
+	printInfo("Performing quantum Fourier transform on the conditioned input register")
+
+	spectrum = np.fft.rfft(amplitudes, norm = 'ortho')
+	del amplitudes
+	half = len(spectrum)
+	probabilities = np.empty(Q)
+	np.square(spectrum.real, out = probabilities[:half])
+	probabilities[:half] += spectrum.imag ** 2
+	del spectrum
+	probabilities[half:] = probabilities[Q - half:0:-1]
+
+	printInfo("Performing a measurement on the periodicity register")
+
+	x = measureProbabilities(probabilities)
+
+	printInfo("QFT register measured\tx = " + str(x))
+
+	return y, x
+
+####################################################################################################
+#                                                                                                   
+#                                          Period finding                                           
+#                                                                                                   
+####################################################################################################
+
 def printEntangles(register):
 	printInfo("Entagles: " + str(register.entangles()))
 
@@ -197,7 +277,7 @@ def hadamard(x, Q):
 
 # Quantum Modular Exponentiation
 def qModExp(a, exp, mod):
-	state = modExp(a, exp, mod)
+	state = modExpTable(a, mod)[exp]
 	amplitude = complex(1.0)
 	return [Mapping(state, amplitude)]
 
@@ -214,15 +294,13 @@ def qft(x, Q):
 
 	return codomain
 
-def findPeriod(a, N):
-	nNumBits = N.bit_length()
-	inputNumBits = (2 * nNumBits) - 1
-	inputNumBits += 1 if ((1 << inputNumBits) < (N * N)) else 0
-	Q = 1 << inputNumBits
+# Simulates the registers of the period finding circuit and returns the
+# measured output register y and QFT register x
+def simulateMeasurements(a, N, Q, inputNumBits):
+	hadamardMap = lambda x: hadamard(x, Q)
+	modExpMap = lambda x: qModExp(a, x, N)
+	qftMap = lambda x: qft(x, Q)
 
-	printInfo("Finding the period...")
-	printInfo("Q = " + str(Q) + "\ta = " + str(a))
-	
 	inputRegister = QubitRegister(inputNumBits)
 	hmdInputRegister = QubitRegister(inputNumBits)
 	qftInputRegister = QubitRegister(inputNumBits)
@@ -231,18 +309,18 @@ def findPeriod(a, N):
 	printInfo("Registers generated")
 	printInfo("Performing Hadamard on input register")
 
-	inputRegister.map(hmdInputRegister, lambda x: hadamard(x, Q), False)
+	inputRegister.map(hmdInputRegister, hadamardMap, False)
 	# inputRegister.hadamard(False)
 
 	printInfo("Hadamard complete")
 	printInfo("Mapping input register to output register, where f(x) is a^x mod N")
 
-	hmdInputRegister.map(outputRegister, lambda x: qModExp(a, x, N), False)
+	hmdInputRegister.map(outputRegister, modExpMap, False)
 
 	printInfo("Modular exponentiation complete")
 	printInfo("Performing quantum Fourier transform on output register")
 
-	hmdInputRegister.map(qftInputRegister, lambda x: qft(x, Q), False)
+	hmdInputRegister.map(qftInputRegister, qftMap, False)
 	inputRegister.propagate()
 
 	printInfo("Quantum Fourier transform complete")
@@ -264,6 +342,116 @@ def findPeriod(a, N):
 
 	printInfo("QFT register measured\tx = " + str(x))
 
+	return y, x
+
+# Samples the same two measurements without simulating the registers.  The
+# sequence a^x mod N is found classically, it repeats with period r after a
+# preperiod mu (0 when a and N are coprime).  Measuring y = a^s mod N leaves
+# the input register uniform over the m states x = s + j r below Q (a single
+# state when s < mu), and the QFT of that register measures k with
+# probability sin^2(pi k r m / Q) / (m Q sin^2(pi k r / Q)).
+#
+# This only depends on e = k r mod Q, a multiple of d = gcd(r, Q) that each
+# of d values of k reach.  With e = d u and M = Q / d, u follows a Fejer
+# kernel on the integers mod M peaked at u = 0 with width about r / d.  The
+# peak is sampled from its exact probabilities, the tails by rejection from
+# the density csc^2(pi u / M) whose inverse CDF is a cotangent, and k is
+# one of the d solutions of k r = e mod Q.  A sample costs O(r) instead of
+# the O(Q) of scanning every outcome
+def sampleMeasurements(a, N, Q):
+	assert np is not None, 'the analytic engine requires numpy'
+
+	table = modExpTable(a, N)
+	mu, r = table.cycle()
+	powers = table.powers
+
+	offsets = np.arange(len(powers), dtype=np.int64)
+	counts = np.where(offsets < mu, 1, (Q - offsets + r - 1) // r)
+	order = np.argsort(np.array(powers, dtype=np.int64))
+
+	measure = random.random()
+	cumulative = np.cumsum(counts[order] / float(Q))
+	i = int(np.searchsorted(cumulative, measure, side = 'right'))
+	if i >= len(order):
+		return None, None
+	s = int(order[i])
+	y = powers[s]
+	m = 1 if s < mu else (Q - s + r - 1) // r
+
+	d = gcd(r, Q)
+	M = Q // d
+	mM = m % M
+
+	def kernel(u):
+		base = u % M
+		peak = base == 0
+		ratio = np.sin(math.pi * ((mM * u) % M) / M) / np.where(peak, 1.0, np.sin(math.pi * base / M))
+		return d * np.where(peak, float(m * m), ratio * ratio) / (m * float(Q))
+
+	# the peak u = -W..W, or every u when M is small
+	W = 4 * (r // d) + 16
+	if 2 * W + 1 >= M:
+		u = np.arange(M, dtype=np.int64)
+	else:
+		u = np.arange(-W, W + 1, dtype=np.int64)
+	cumulative = np.cumsum(kernel(u))
+
+	measure = random.random()
+	i = int(np.searchsorted(cumulative, measure, side = 'right'))
+	if i < len(u):
+		e = int(u[i])
+	elif len(u) == M:
+		return y, None
+	else:
+		e = sampleTail(m, M, W)
+
+	k = (e % M) * pow(r // d, -1, M) % M
+	return y, k + M * random.randrange(d)
+
+# Samples u in W < |u| <= M / 2 with probability proportional to
+# sin^2(pi m u / M) / sin^2(pi u / M).  Proposals come from the continuous
+# density csc^2(pi x / M) on [W + 1/2, M / 2 + 1/2], whose integral over the
+# cell of u bounds csc^2(pi u / M) from above as csc^2 is convex, and u and
+# -u are the same point when u = M / 2
+def sampleTail(m, M, W):
+	def cot(x):
+		return math.cos(x) / math.sin(x)
+
+	scale = math.pi / M
+	low = cot(scale * (W + 0.5))
+	high = cot(scale * (M // 2 + 0.5))
+	while True:
+		x = math.atan2(1.0, low - random.random() * (low - high)) / scale
+		u = min(max(int(math.floor(x + 0.5)), W + 1), M // 2)
+		cell = (cot(scale * (u - 0.5)) - cot(scale * (u + 0.5))) / scale
+		multiplicity = 2 if 2 * u < M else 1
+		accept = (math.sin(scale * ((m * u) % M)) / math.sin(scale * u)) ** 2 / cell * multiplicity / 2.0
+		if random.random() < accept:
+			break
+
+	if multiplicity == 2 and random.random() < 0.5:
+		return -u
+	return u
+
+def findPeriod(a, N, engine = 'object'):
+	nNumBits = N.bit_length()
+	inputNumBits = (2 * nNumBits) - 1
+	inputNumBits += 1 if ((1 << inputNumBits) < (N * N)) else 0
+	Q = 1 << inputNumBits
+
+	printInfo("Finding the period...")
+	printInfo("Q = " + str(Q) + "\ta = " + str(a))
+	
+	if engine == 'analytic':
+		printInfo("Sampling the output and QFT register measurements")
+		y, x = sampleMeasurements(a, N, Q)
+		printInfo("Output register measured\ty = " + str(y))
+		printInfo("QFT register measured\tx = " + str(x))
+	elif engine == 'array':
+		y, x = arrayMeasurements(a, N, Q)
+	else:
+		y, x = simulateMeasurements(a, N, Q, inputNumBits)
+
 	if x is None:
 		return None
 
@@ -282,6 +470,17 @@ def findPeriod(a, N):
 ####################################################################################################
 
 BIT_LIMIT = 12
+# The array engine holds a few arrays of Q = 2^(2 bits) doubles, about 2GB
+# at 13 bits
+ARRAY_BIT_LIMIT = 13
+# The analytic sampler walks a^x mod N until it repeats, O(N), about 1s at
+# 20 bits.  Beyond that the products of its int64 kernel phases may overflow
+ANALYTIC_BIT_LIMIT = 20
+
+def bitLimit(engine):
+	if engine == 'analytic':
+		return ANALYTIC_BIT_LIMIT
+	return ARRAY_BIT_LIMIT if engine == 'array' else BIT_LIMIT
 
 def bitCount(x):
 	sumBits = 0
@@ -348,6 +547,77 @@ def modExp(a, exp, mod):
 
 	return fx
 
+# Table of a^x mod N for a fixed a and N.  The powers are built one multiply
+# at a time and only until the sequence repeats, after a preperiod mu it
+# cycles with period r, so at most N values are stored whatever x is asked for
+class ModExpTable:
+	def __init__(self, a, N):
+		self.a = a
+		self.N = N
+		self.powers = [1 % N]
+		self.first = {self.powers[0]: 0}
+		self.mu = None
+		self.r = None
+
+	def extend(self, x):
+		while self.r is None and len(self.powers) <= x:
+			value = (self.powers[-1] * self.a) % self.N
+			if value in self.first:
+				self.mu = self.first[value]
+				self.r = len(self.powers) - self.mu
+			else:
+				self.first[value] = len(self.powers)
+				self.powers.append(value)
+
+	# Returns the preperiod and period of the sequence
+	def cycle(self):
+		self.extend(self.N)
+		return self.mu, self.r
+
+	def __getitem__(self, x):
+		# Matches modExp, which returns 1 for negative exponents
+		if x < 0:
+			return 1
+
+		self.extend(x)
+		if x < len(self.powers):
+			return self.powers[x]
+
+		return self.powers[self.mu + (x - self.mu) % self.r]
+
+	# a^x mod N for all x < Q as a numpy array
+	def values(self, Q):
+		# a^x mod N for x < Q in the smallest unsigned type holding N, filled
+		# by doubling copies of the cycle so no index temporaries are made
+		self.extend(Q - 1)
+		values = np.empty(Q, dtype=np.min_scalar_type(self.N))
+		known = min(len(self.powers), Q)
+		values[:known] = self.powers[:known]
+		while known < Q:
+			length = min(known - self.mu, Q - known)
+			values[known:known + length] = values[self.mu:self.mu + length]
+			known += length
+
+		return values
+
+MODEXP_CACHE_SIZE = 16
+modExpTables = collections.OrderedDict()
+
+# Tables are shared by the quantum map and the candidate checks of an attempt,
+# and kept for the most recently used values of (a, N) across attempts
+def modExpTable(a, N):
+	key = (a, N)
+	if key in modExpTables:
+		modExpTables.move_to_end(key)
+		return modExpTables[key]
+
+	table = ModExpTable(a, N)
+	modExpTables[key] = table
+	if len(modExpTables) > MODEXP_CACHE_SIZE:
+		modExpTables.popitem(last = False)
+
+	return table
+
 def pick(N):
 	a = math.floor((random.random() * (N - 1)) + 0.5)
 	return a
@@ -356,84 +626,144 @@ def checkCandidates(a, r, N, neighborhood):
 	if r is None:
 		return None
 
+	table = modExpTable(a, N)
+	base = table[a]
+
 	# Check multiples
 	for k in range(1, neighborhood + 2):
 		tR = k * r
-		if modExp(a, a, N) == modExp(a, a + tR, N):
+		if base == table[a + tR]:
 			return tR
 
 	# Check lower neighborhood
 	for tR in range(r - neighborhood, r):
-		if modExp(a, a, N) == modExp(a, a + tR, N):
+		if base == table[a + tR]:
 			return tR
 
 	# Check upper neigborhood
 	for tR in range(r + 1, r + neighborhood + 1):
-		if modExp(a, a, N) == modExp(a, a + tR, N):
+		if base == table[a + tR]:
 			return tR
 
 	return None
 
-def shors(N, attempts = 1, neighborhood = 0.0, numPeriods = 1):
-	if(N.bit_length() > BIT_LIMIT or N < 3):
-		return False
+# One attempt: picks a, finds a candidate period and checks it, returns
+# (a, r) for a usable period and None otherwise
+def attemptPeriod(N, neighborhood, engine):
+	a = pick(N)
+	while a < 2:
+		a = pick(N)
+
+	d = gcd(a, N)
+	if d > 1:
+		printInfo("Found factors classically, re-attempt")
+		return None
+
+	r = findPeriod(a, N, engine)
 
+	printInfo("Checking candidate period, nearby values, and multiples")
+
+	r = checkCandidates(a, r, N, neighborhood)
+
+	if r is None:
+		printInfo("Period was not found, re-attempt")
+		return None
+
+	if (r % 2) > 0:
+		printInfo("Period was odd, re-attempt")
+		return None
+
+	d = modExpTable(a, N)[r // 2]
+	if r == 0 or d == (N - 1):
+		printInfo("Period was trivial, re-attempt")
+		return None
+
+	printInfo("Period found\tr = " + str(r))
+
+	return a, r
+
+def factorsFromPeriods(a, periods, N):
+	printInfo("\nFinding least common multiple of all periods")
+
+	r = 1
+	for period in periods:
+		d = gcd(period, r)
+		r = (r * period) // d
+
+	b = modExpTable(a, N)[r // 2]
+	f1 = gcd(N, b + 1)
+	f2 = gcd(N, b - 1)
+
+	return [f1, f2]
+
+def initWorker():
+	global printInfo
+	printInfo = printNone
+
+# Workers start as copies of the parent, so each attempt reseeds with its own
+# seed to draw a distinct random stream
+def seededAttempt(args):
+	attempt, N, neighborhood, engine, seed = args
+	random.seed(seed)
+	return attempt, attemptPeriod(N, neighborhood, engine)
+
+# Runs the attempts on a pool of worker processes and collects periods in the
+# order attempts finish, the pool is terminated as soon as enough periods are
+# found so queued and running attempts are dropped
+def parallelShors(N, attempts, neighborhood, numPeriods, engine, workers):
 	periods = []
-	neighborhood = math.floor(N * neighborhood) + 1
+	tasks = [(attempt, N, neighborhood, engine, random.getrandbits(64)) for attempt in range(attempts)]
 
-	printInfo("N = " + str(N))
-	printInfo("Neighborhood = " + str(neighborhood))
-	printInfo("Number of periods = " + str(numPeriods))
+	pool = multiprocessing.Pool(workers, initializer = initWorker)
+	try:
+		for attempt, result in pool.imap_unordered(seededAttempt, tasks):
+			if result is None:
+				printInfo("Attempt #" + str(attempt) + " found no period")
+				continue
 
-	for attempt in range(attempts):
-		printInfo("\nAttempt #" + str(attempt))
+			a, r = result
+			printInfo("Attempt #" + str(attempt) + " found period\tr = " + str(r) + "\ta = " + str(a))
 
-		a = pick(N)
-		while a < 2:
-			a = pick(N)
+			periods.append(r)
+			if(len(periods) < numPeriods):
+				continue
 
-		d = gcd(a, N)
-		if d > 1:
-			printInfo("Found factors classically, re-attempt")
-			continue
+			return factorsFromPeriods(a, periods, N)
+	finally:
+		pool.terminate()
+		pool.join()
+
+	return None
 
-		r = findPeriod(a, N)
+def shors(N, attempts = 1, neighborhood = 0.0, numPeriods = 1, engine = 'object', workers = 1):
+	if(N.bit_length() > bitLimit(engine) or N < 3):
+		return False
 
-		printInfo("Checking candidate period, nearby values, and multiples")
+	periods = []
+	neighborhood = math.floor(N * neighborhood) + 1
 
-		r = checkCandidates(a, r, N, neighborhood)
+	printInfo("N = " + str(N))
+	printInfo("Neighborhood = " + str(neighborhood))
+	printInfo("Number of periods = " + str(numPeriods))
 
-		if r is None:
-			printInfo("Period was not found, re-attempt")
-			continue
+	if workers > 1:
+		printInfo("Workers = " + str(workers))
+		return parallelShors(N, attempts, neighborhood, numPeriods, engine, workers)
 
-		if (r % 2) > 0:
-			printInfo("Period was odd, re-attempt")
-			continue
+	for attempt in range(attempts):
+		printInfo("\nAttempt #" + str(attempt))
 
-		d = modExp(a, (r // 2), N)
-		if r == 0 or d == (N - 1):
-			printInfo("Period was trivial, re-attempt")
+		result = attemptPeriod(N, neighborhood, engine)
+		if result is None:
 			continue
 
-		printInfo("Period found\tr = " + str(r))
+		a, r = result
 
 		periods.append(r)
 		if(len(periods) < numPeriods):
 			continue
 
-		printInfo("\nFinding least common multiple of all periods")
-
-		r = 1
-		for period in periods:
-			d = gcd(period, r)
-			r = (r * period) // d
-
-		b = modExp(a, (r // 2), N)
-		f1 = gcd(N, b + 1)
-		f2 = gcd(N, b - 1)
-
-		return [f1, f2]
+		return factorsFromPeriods(a, periods, N)
 
 	return None
 
@@ -449,6 +779,8 @@ def parseArgs():
 	parser.add_argument('-n', '--neighborhood', type=float, default=0.01, help='Neighborhood size for checking candidates (as percentage of N)')
 	parser.add_argument('-p', '--periods', type=int, default=2, help='Number of periods to get before determining least common multiple')
 	parser.add_argument('-v', '--verbose', type=bool, default=True, help='Verbose')
+	parser.add_argument('-e', '--engine', choices=['object', 'array', 'analytic'], default='object', help='Register simulation: one object per basis state, numpy arrays (requires numpy, allows N up to ' + str(ARRAY_BIT_LIMIT) + ' bits), or sampling the measurements from their closed form distribution without registers (requires numpy, allows N up to ' + str(ANALYTIC_BIT_LIMIT) + ' bits)')
+	parser.add_argument('-w', '--workers', type=int, default=1, help='Number of processes running attempts in parallel, stopping once enough periods are found')
 	parser.add_argument('N', type=int, help='The integer to factor')
 	return parser.parse_args()
 
@@ -461,7 +793,7 @@ def main():
 	else:
 		printInfo = printNone
 
-	factors = shors(args.N, args.attempts, args.neighborhood, args.periods)
+	factors = shors(args.N, args.attempts, args.neighborhood, args.periods, args.engine, args.workers)
 	if factors is not None:
 		print("Factors:\t" + str(factors[0]) + ", " + str(factors[1]))
 